@@ -1,11 +1,52 @@
-import os
 import warnings
-from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
 import scipy.stats as stats
-from scipy.stats import bootstrap
+
+from utils.results_store import ResultsStore
+
+
+def bootstrap_median_ci(
+    data: np.ndarray,
+    n_resamples: int = 20000,
+    confidence_level: float = 0.95,
+    rng: np.random.Generator | None = None,
+) -> tuple[float, float]:
+    """Percentile bootstrap confidence interval of the median, computed for all
+    resamples at once. The median of a resample only depends on its middle order
+    statistics: the k-th smallest of n uniform indices is n times a beta(k, n-k+1)
+    variable, and the (k+1)-th smallest follows from a beta(1, n-k) variable. This
+    gives the same bootstrap distribution as resampling the data."""
+    if rng is None:
+        rng = np.random.default_rng()
+    n = len(data)
+    data_sorted = np.sort(data)
+    k = (n + 1) // 2
+    uniform_k = rng.beta(k, n - k + 1, size=n_resamples)
+    medians = data_sorted[np.minimum((n * uniform_k).astype(np.int64), n - 1)]
+    if n % 2 == 0:
+        uniform_k1 = uniform_k + (1 - uniform_k) * rng.beta(1, n - k, size=n_resamples)
+        index_k1 = np.minimum((n * uniform_k1).astype(np.int64), n - 1)
+        medians = (medians + data_sorted[index_k1]) / 2
+    alpha = 1 - confidence_level
+    ci_low, ci_high = np.percentile(medians, [100 * alpha / 2, 100 * (1 - alpha / 2)])
+    return ci_low, ci_high
+
+
+def exact_median_ci(
+    data: np.ndarray, confidence_level: float = 0.95
+) -> tuple[float, float]:
+    """Distribution-free confidence interval of the median based on order
+    statistics: the number of values below the median is binomial(n, 1/2)."""
+    n = len(data)
+    alpha = 1 - confidence_level
+    j = int(stats.binom.ppf(alpha / 2, n, 0.5))
+    if j < 1:
+        return -np.inf, np.inf
+    data_partitioned = np.partition(data, [j - 1, n - j])
+    return data_partitioned[j - 1], data_partitioned[n - j]
 
 
 def wilcoxon_results(
@@ -13,6 +54,7 @@ def wilcoxon_results(
     data_paired: np.ndarray | None = None,
     median_hypothesis: float | None = None,
     compute_ci: bool = True,
+    ci_method: str = "bootstrap",
 ):
     """Perform Wilcoxon signed-rank test, compute effect size and confidence
     intervals.
@@ -26,6 +68,9 @@ def wilcoxon_results(
         performed. Defaults to None.
         compute_ci: Boolean determining whether to compute the confidence intervals,
         which is computationally costly. Defaults to True.
+        ci_method: Method of the confidence intervals of the median difference,
+        either 'bootstrap' (percentile bootstrap with 20000 resamples) or 'exact'
+        (order statistics, much faster). Defaults to 'bootstrap'.
 
     Returns
     -------
@@ -77,21 +122,15 @@ def wilcoxon_results(
     # sample size)
     Z = abs((W - E_W) / np.sqrt(Var_W))
 
-    # Step 8: Compute confidence intervals using bootstrap method
-    bootstrap_ci = partial(
-        bootstrap,
-        statistic=np.median,
-        vectorized=False,
-        n_resamples=20000,
-        method="percentile",
-        confidence_level=0.95,
-        rng=np.random.default_rng(),
-    )
+    # Step 8: Compute confidence intervals using bootstrap or exact method
     ci_low, ci_high = np.nan, np.nan
     if compute_ci:
-        bootstrap_ci_result = bootstrap_ci((data_diff,))
-        ci_low = bootstrap_ci_result.confidence_interval.low
-        ci_high = bootstrap_ci_result.confidence_interval.high
+        if ci_method == "bootstrap":
+            ci_low, ci_high = bootstrap_median_ci(data_diff)
+        elif ci_method == "exact":
+            ci_low, ci_high = exact_median_ci(data_diff)
+        else:
+            raise ValueError(f"Unknown ci_method: {ci_method}.")
 
     # Step 9: Compute ratio of positive differences
     ratio_pos = data_diff[data_diff > 0].size / n
@@ -109,6 +148,22 @@ def wilcoxon_results(
     }
 
 
+def _wilcoxon_task(task: tuple[tuple, dict]) -> dict:
+    args, kwargs = task
+    return wilcoxon_results(*args, **kwargs)
+
+
+def wilcoxon_results_cells(
+    tasks: list[tuple[tuple, dict]], n_jobs: int | None = None
+) -> list[dict]:
+    """Runs wilcoxon_results for the (args, kwargs) of each grid cell, in parallel
+    over n_jobs processes (all cores if None) unless n_jobs is 1."""
+    if n_jobs == 1 or len(tasks) <= 1:
+        return [_wilcoxon_task(task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        return list(executor.map(_wilcoxon_task, tasks))
+
+
 def produce_df_1samp(
     outcome: str = "accuracy_opinion",
     diverse_team_type: str = "diverse",
@@ -120,11 +175,14 @@ def produce_df_1samp(
     p_decimals: int = 4,
     date: str = "",
     compute_ci: bool = True,
+    ci_method: str = "bootstrap",
+    n_jobs: int | None = 1,
 ) -> pd.DataFrame:
     """Produces a DataFrame summarizing one-sample Wilcoxon test results comparing
     diverse team performance against expert team performance.
 
-    Note: Assumes simulation data files are in folder named 'data'
+    Note: Assumes simulation results are in the results store 'data/store', csv
+    files in the folder 'data' are imported into it first.
 
     Args:
         outcome: The performance metric to analyze. Defaults to "accuracy_opinion".
@@ -141,6 +199,10 @@ def produce_df_1samp(
         date: Date string to filter simulation files. Defaults to empty string ''.
         compute_ci: Boolean determining whether to compute the confidence intervals,
         which is computationally costly. Defaults to True.
+        ci_method: Method of the confidence intervals, either 'bootstrap' or 'exact'.
+        Defaults to 'bootstrap'.
+        n_jobs: Number of processes testing the grid cells in parallel, all cores if
+        None. Defaults to 1.
 
     Returns:
         A pandas DataFrame containing the results of the one-sample Wilcoxon tests.
@@ -150,85 +212,103 @@ def produce_df_1samp(
         A ratio of 0.8 means 80% of non-zero differences had the same sign.
     """
 
-    files = [
-        file
-        for file in os.listdir("data")
-        if file.split("_")[0] == "simulation" and date in file.split("_")[1]
-    ]
     heuristic_str: str | int = heuristic_size  # type: ignore
     if isinstance(heuristic_size, list):
         heuristic_str = str(heuristic_str)[1:-1].replace(", ", "-")  # type: ignore
 
-    results = []
-    for file in files:
-        df = pd.read_csv(f"data/{file}")
-        if (
-            heuristic_str in df.heuristic_size.values
-            and team_size in df.team_size.values
-            and reliability_range in df.reliability_range.values
-        ):
-            if diverse_team_type in df.team_type.values:
-                n_sources = df.at[0, "n_sources"]
-                if n_sources not in n_sources_list:
-                    continue
-                rel_mean = df.at[0, "reliability_mean"]
-                df_diverse = df[df["team_type"] == diverse_team_type]
-                diverse_accuracy = df_diverse[outcome].median()
-                expert_accuracy = df[df["team_type"] == "expert"][outcome].median()
-
-                diverse_error = 1 - diverse_accuracy
-                expert_error = 1 - expert_accuracy
-
-                if diverse_accuracy > expert_accuracy:
-                    error_reduction = (
-                        100 * (expert_error - diverse_error) / diverse_error
-                    )
-                    # error_reduction = - (expert_error / diverse_error)
-                elif expert_accuracy > diverse_accuracy:
-                    error_reduction = (
-                        -100 * (diverse_error - expert_error) / expert_error
-                    )
-                    # error_reduction = diverse_error / expert_error
-                else:
-                    error_reduction = 0
-
-                if outcome == "accuracy_evidence":
-                    difference = diverse_accuracy - expert_accuracy
-                    pvalue = np.nan
-                    effect_size = np.nan
-                    ci_low = np.nan
-                    ci_high = np.nan
-                    ties = False
-                    ratio = np.nan
-
-                else:
-                    statistic_results = wilcoxon_results(
-                        np.array(df_diverse[outcome]),
-                        median_hypothesis=expert_accuracy,
-                        compute_ci=compute_ci,
-                    )
-                    difference = statistic_results["difference"]
-                    pvalue = statistic_results["p_value"]
-                    effect_size = statistic_results["effect_size"]
-                    ci_low = statistic_results["ci_low"]
-                    ci_high = statistic_results["ci_high"]
-                    ties = statistic_results["ties"]
-                    ratio = statistic_results["ratio"]
-
-                results.append(
-                    [
-                        n_sources,
-                        rel_mean,
-                        round(difference, n_decimals),
-                        round(error_reduction, 1),
-                        round(pvalue, p_decimals),
-                        round(effect_size, 3),
-                        ci_low,
-                        ci_high,
-                        ties,
-                        ratio,
-                    ]
+    store = ResultsStore()
+    store.import_csv_directory("data")
+    partitions = store.select(
+        date=date,
+        heuristic_size=heuristic_str,
+        team_size=team_size,
+        reliability_range=reliability_range,
+        n_sources=n_sources_list,
+    )
+
+    cells = []
+    tasks = []
+    for partition in partitions:
+        if diverse_team_type in store.parameters(partition)["team_types"]:
+            df = store.read_cached(partition)
+            n_sources = df.at[0, "n_sources"]
+            rel_mean = df.at[0, "reliability_mean"]
+            df_diverse = df[df["team_type"] == diverse_team_type]
+            diverse_accuracy = df_diverse[outcome].median()
+            expert_accuracy = df[df["team_type"] == "expert"][outcome].median()
+
+            diverse_error = 1 - diverse_accuracy
+            expert_error = 1 - expert_accuracy
+
+            if diverse_accuracy > expert_accuracy:
+                error_reduction = 100 * (expert_error - diverse_error) / diverse_error
+                # error_reduction = - (expert_error / diverse_error)
+            elif expert_accuracy > diverse_accuracy:
+                error_reduction = -100 * (diverse_error - expert_error) / expert_error
+                # error_reduction = diverse_error / expert_error
+            else:
+                error_reduction = 0
+
+            cells.append(
+                (
+                    n_sources,
+                    rel_mean,
+                    diverse_accuracy - expert_accuracy,
+                    error_reduction,
+                )
+            )
+            tasks.append(
+                (
+                    (np.array(df_diverse[outcome]),),
+                    {
+                        "median_hypothesis": expert_accuracy,
+                        "compute_ci": compute_ci,
+                        "ci_method": ci_method,
+                    },
                 )
+            )
+
+    # The grid cells are tested in parallel
+    if outcome == "accuracy_evidence":
+        statistics_results = [None] * len(cells)
+    else:
+        statistics_results = wilcoxon_results_cells(tasks, n_jobs)
+
+    results = []
+    for (n_sources, rel_mean, difference, error_reduction), statistic_results in zip(
+        cells, statistics_results
+    ):
+        if statistic_results is None:
+            pvalue = np.nan
+            effect_size = np.nan
+            ci_low = np.nan
+            ci_high = np.nan
+            ties = False
+            ratio = np.nan
+
+        else:
+            difference = statistic_results["difference"]
+            pvalue = statistic_results["p_value"]
+            effect_size = statistic_results["effect_size"]
+            ci_low = statistic_results["ci_low"]
+            ci_high = statistic_results["ci_high"]
+            ties = statistic_results["ties"]
+            ratio = statistic_results["ratio"]
+
+        results.append(
+            [
+                n_sources,
+                rel_mean,
+                round(difference, n_decimals),
+                round(error_reduction, 1),
+                round(pvalue, p_decimals),
+                round(effect_size, 3),
+                ci_low,
+                ci_high,
+                ties,
+                ratio,
+            ]
+        )
 
     columns = [
         "n_sources",
@@ -257,11 +337,14 @@ def produce_df_paired(
     p_decimals: int = 4,
     date: str = "",
     compute_ci: bool = True,
+    ci_method: str = "bootstrap",
+    n_jobs: int | None = 1,
 ):
     """Produces a DataFrame summarizing paired Wilcoxon test results comparing
     diverse team performance for mechanisms x and y.
 
-    Note: Assumes simulation data files are in folder named 'data'.
+    Note: Assumes simulation results are in the results store 'data/store', csv
+    files in the folder 'data' are imported into it first.
 
     Args:
         x: The first deliberative mechanism. Defaults to 'accuracy_evidence'.
@@ -279,6 +362,10 @@ def produce_df_paired(
         date: Date string to filter simulation files. Defaults to empty string ''.
         compute_ci: Boolean determining whether to compute the confidence intervals,
         which is computationally costly. Defaults to True.
+        ci_method: Method of the confidence intervals, either 'bootstrap' or 'exact'.
+        Defaults to 'bootstrap'.
+        n_jobs: Number of processes testing the grid cells in parallel, all cores if
+        None. Defaults to 1.
 
     Returns:
         A pandas DataFrame containing the results of the one-sample Wilcoxon tests.
@@ -287,47 +374,60 @@ def produce_df_paired(
         'ratio': Represents the proportion of differences with the dominant sign.
         A ratio of 0.8 means 80% of non-zero differences had the same sign.
     """
-    files = [
-        file
-        for file in os.listdir("data")
-        if file.split("_")[0] == "simulation" and date in file.split("_")[1]
-    ]
     heuristic_str: str | int = heuristic_size  # type: ignore
     if isinstance(heuristic_size, list):
         heuristic_str = str(heuristic_str)[1:-1].replace(", ", "-")  # type: ignore
 
-    results = []
-    for file in files:
-        df = pd.read_csv(f"data/{file}")
-        if (
-            heuristic_str in df.heuristic_size.values
-            and team_size in df.team_size.values
-            and reliability_range in df.reliability_range.values
-        ):
-            if diverse_team_type in df.team_type.values:
-                n_sources = df.at[0, "n_sources"]
-                if n_sources not in n_sources_list:
-                    continue
-                rel_mean = df.at[0, "reliability_mean"]
-                df_diverse = df[df["team_type"] == diverse_team_type]
-                data_x = np.array(df_diverse[x])
-                data_y = np.array(df_diverse[y])
-                statistics_result = wilcoxon_results(
-                    data_x, data_paired=data_y, compute_ci=compute_ci
-                )
-                results.append(
-                    [
-                        n_sources,
-                        rel_mean,
-                        round(statistics_result["difference"], n_decimals),
-                        round(statistics_result["p_value"], p_decimals),
-                        statistics_result["effect_size"],
-                        round(statistics_result["ci_low"], n_decimals),
-                        round(statistics_result["ci_high"], n_decimals),
-                        statistics_result["ties"],
-                        statistics_result["ratio"],
-                    ]
+    store = ResultsStore()
+    store.import_csv_directory("data")
+    partitions = store.select(
+        date=date,
+        heuristic_size=heuristic_str,
+        team_size=team_size,
+        reliability_range=reliability_range,
+        n_sources=n_sources_list,
+    )
+
+    cells = []
+    tasks = []
+    for partition in partitions:
+        if diverse_team_type in store.parameters(partition)["team_types"]:
+            df = store.read_cached(partition)
+            n_sources = df.at[0, "n_sources"]
+            rel_mean = df.at[0, "reliability_mean"]
+            df_diverse = df[df["team_type"] == diverse_team_type]
+            data_x = np.array(df_diverse[x])
+            data_y = np.array(df_diverse[y])
+            cells.append((n_sources, rel_mean))
+            tasks.append(
+                (
+                    (data_x,),
+                    {
+                        "data_paired": data_y,
+                        "compute_ci": compute_ci,
+                        "ci_method": ci_method,
+                    },
                 )
+            )
+
+    # The grid cells are tested in parallel
+    results = []
+    for (n_sources, rel_mean), statistics_result in zip(
+        cells, wilcoxon_results_cells(tasks, n_jobs)
+    ):
+        results.append(
+            [
+                n_sources,
+                rel_mean,
+                round(statistics_result["difference"], n_decimals),
+                round(statistics_result["p_value"], p_decimals),
+                statistics_result["effect_size"],
+                round(statistics_result["ci_low"], n_decimals),
+                round(statistics_result["ci_high"], n_decimals),
+                statistics_result["ties"],
+                statistics_result["ratio"],
+            ]
+        )
     columns = [
         "n_sources",
         "rel_mean",
@@ -14,13 +14,14 @@ def heatmap(
     show: bool = False,
     show_cbar: bool = True,
     filename: str | None = None,
+    ci_method: str = "bootstrap",
 ):
     df = produce_df_1samp(
         outcome=outcome,
         diverse_team_type=diverse_team_type,
         heuristic_size=heuristic_size,
         n_sources_list=n_sources_list,
-        compute_ci=False,
+        ci_method=ci_method,
     )
     if measure == "absolute":
         df["effect_percent"] = 100 * df["difference"]
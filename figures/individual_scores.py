@@ -1,11 +1,9 @@
-from math import comb
-
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import seaborn as sns
 
-from models.generate_teams import generate_expert_team
+from models.agent_pool import get_agent_pool
 from models.sources import Sources
 
 
@@ -15,9 +13,7 @@ def boxplot_individual_scores(n_sources: int = 13, heuristic_size: int = 5, show
     for rel_mean in rel_mean_list:
         reliability_distribution = ("equi", rel_mean, 0.2)
         sources = Sources(n_sources, reliability_distribution)
-        n_possible_heuristics = comb(n_sources, heuristic_size)
-        team = generate_expert_team(sources, heuristic_size, n_possible_heuristics)
-        data = np.array([agent.score for agent in team.members])
+        data = get_agent_pool(sources, heuristic_size).scores
         data_df = pd.DataFrame(data, columns=[rel_mean])
         scores_df = pd.concat([scores_df, data_df], axis=1)
 
@@ -60,10 +56,7 @@ def df_individual_scores(n_sources: int = 13, heuristic_size: int = 5):
         for rel_mean in rel_mean_list:
             reliability_distribution = ("equi", rel_mean, 0.2)
             sources = Sources(n_sources, reliability_distribution)
-            n_possible_heuristics = comb(n_sources, heuristic_size)
-            team = generate_expert_team(sources, heuristic_size, n_possible_heuristics)
-            data = np.array([agent.score for agent in team.members])
-            data = np.array([agent.score for agent in team.members])
+            data = get_agent_pool(sources, heuristic_size).scores
             data_mean = data.mean() * 100
             data_std = data.std() * 100
             data_max = data.max() * 100
@@ -1,7 +1,9 @@
+import time
+
 import pandas as pd
 from IPython.display import display
 
-from simulation import Simulation
+from simulation import Simulation, run_simulations
 
 
 class GridSimulation:
@@ -14,6 +16,7 @@ class GridSimulation:
         heuristic_size: int | list = 5,
         team_size: int = 9,
         estimate_sample_size: int | None = None,
+        target_precision: float | None = None,
     ):
         self.team_types = team_types
         self.n_sources_list = n_sources_list
@@ -22,16 +25,25 @@ class GridSimulation:
         self.heuristic_size = heuristic_size
         self.team_size = team_size
         self.estimate_sample_size = estimate_sample_size
+        self.target_precision = target_precision
 
-    def run(self):
+    def run(self, time_str: str | None = None, resume: bool = False):
+        """Runs the grid, writing data/simulation_<time_str>_<cell>.csv per cell. To
+        resume an interrupted grid, pass its time_str and resume=True."""
         params_df = self.create_parameter_df()
         display(params_df)
-        total = len(params_df)
+        if time_str is None:
+            time_str = time.strftime("%Y%m%d_%H%M%S")
+        simulations = []
         for idx, params in params_df.iterrows():
             # convert to dict and turn NaN values into None
             params_dict = params.where(pd.notnull(params), None).to_dict()
-            print(f"Running simulation {idx} out of {total}...")
-            Simulation(**params_dict).run()
+            filename_csv = f"data/simulation_{time_str}_{idx}.csv"
+            simulations.append(
+                Simulation(filename_csv=filename_csv, resume=resume, **params_dict)
+            )
+        print(f"Running {len(simulations)} simulations on one process pool...")
+        run_simulations(simulations)
 
     def create_parameter_df(self):
         data = [
@@ -43,10 +55,13 @@ class GridSimulation:
                 "team_size": self.team_size,
                 "n_samples": self.n_samples,
                 "estimate_sample_size": None,
+                "target_precision": self.target_precision,
             }
             for n_sources in self.n_sources_list
             for rel_dist in self.reliability_distribution_list
         ]
+        # Only the opinion-based accuracy is estimated for many sources, the bounded
+        # accuracy is computed exactly regardless of the number of sources
         for item in data:
             if item["n_sources"] > 20:
                 item["estimate_sample_size"] = self.estimate_sample_size
@@ -1,5 +1,9 @@
 from models.sources import Sources
-from utils.basic_functions import calculate_competence, majority_winner
+from utils.basic_functions import (
+    calculate_competence,
+    heuristic_to_mask,
+    majority_winner,
+)
 
 
 class Agent:
@@ -11,17 +15,21 @@ class Agent:
         heuristic:
             The agent’s heuristic, which is represented by the set of sources she has
             access to.
+        mask:
+            The agent’s heuristic as a bitmask, bit s is set iff the heuristic contains
+            source s.
         sources (Sources):
             The sources that the agent could access.
         score:
             The agent’s score.
     """
 
-    def __init__(self, no, heuristic, sources: Sources):
+    def __init__(self, no, heuristic, sources: Sources, score: float | None = None):
         self.no = no
         self.heuristic = heuristic
+        self.mask = heuristic_to_mask(heuristic)
         self.sources = sources
-        self.score = self.competence()
+        self.score = self.competence() if score is None else float(score)
         self.update_opinion()
 
     def update_opinion(self) -> None:
@@ -0,0 +1,91 @@
+from functools import lru_cache
+from itertools import chain, combinations
+
+import numpy as np
+
+from models.agent import Agent
+from models.sources import Sources
+from utils.basic_functions import (
+    calculate_competences,
+    check_mask_sources,
+    mask_to_heuristic,
+)
+
+
+class AgentPool:
+    """
+    A class representing the pool of all possible agents for given sources, i.e. one
+    agent for every heuristic of the given size(s). The agents are stored as arrays
+    (one entry per agent) and Agent objects are only created for selected agents.
+
+    Attributes
+    ----------
+        ids (np.array[int]):
+            The agents’ ids.
+        masks (np.array[np.uint64]):
+            The agents’ heuristics as bitmasks, bit s is set iff the heuristic contains
+            source s.
+        sizes (np.array[int]):
+            The sizes of the agents’ heuristics.
+        scores (np.array[float]):
+            The agents’ scores.
+        ranking (np.array[int]):
+            The agents’ ids sorted from the highest to the lowest score.
+    """
+
+    def __init__(self, reliabilities: np.ndarray, heuristic_size: int | list):
+        if not isinstance(heuristic_size, list):
+            heuristic_size = [heuristic_size]
+        n_sources = len(reliabilities)
+        check_mask_sources(n_sources)
+        bits = np.left_shift(np.uint64(1), np.arange(n_sources, dtype=np.uint64))
+
+        masks, sizes, scores = [], [], []
+        for size in heuristic_size:
+            heuristics = np.fromiter(
+                chain.from_iterable(combinations(range(n_sources), size)), dtype=int
+            ).reshape(-1, size)
+            masks.append(
+                np.bitwise_or.reduce(bits[heuristics], axis=1, initial=np.uint64(0))
+            )
+            sizes.append(np.full(len(heuristics), size))
+            scores.append(calculate_competences(reliabilities[heuristics]))
+        self.masks: np.ndarray = np.concatenate(masks)
+        self.sizes: np.ndarray = np.concatenate(sizes)
+        self.scores: np.ndarray = np.concatenate(scores)
+        self.ids: np.ndarray = np.arange(len(self.masks))
+        self.ranking: np.ndarray = np.argsort(-self.scores, kind="stable")
+
+    def __len__(self) -> int:
+        return len(self.masks)
+
+    def heuristic(self, id: int) -> tuple:
+        return mask_to_heuristic(self.masks[id])
+
+    def top(self, n_agents: int) -> np.ndarray:
+        """Returns the ids of the n_agents agents with the highest scores."""
+        return self.ranking[:n_agents]
+
+    def percentile(self, qualifying_percentile: float) -> float:
+        return float(np.percentile(self.scores, qualifying_percentile))
+
+    def agents(self, ids, sources: Sources) -> list[Agent]:
+        return [
+            Agent(int(id), self.heuristic(id), sources, score=self.scores[id])
+            for id in ids
+        ]
+
+
+@lru_cache(maxsize=32)
+def _cached_agent_pool(reliabilities: tuple, heuristic_size: tuple) -> AgentPool:
+    return AgentPool(np.array(reliabilities), list(heuristic_size))
+
+
+def get_agent_pool(sources: Sources, heuristic_size: int | list) -> AgentPool:
+    """Returns the agent pool for the sources, which is cached (per process) for each
+    combination of reliabilities and heuristic size(s)."""
+    if not isinstance(heuristic_size, list):
+        heuristic_size = [heuristic_size]
+    return _cached_agent_pool(
+        tuple(sources.reliabilities.tolist()), tuple(heuristic_size)
+    )
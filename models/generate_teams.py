@@ -1,76 +1,51 @@
-import itertools as it
 import random as rd
 import time
 
 import numpy as np
 
-from models.agent import Agent
+from models.agent_pool import AgentPool, get_agent_pool
 from models.sources import Sources
 from models.team import Team
-from utils.basic_functions import calculate_diversity
+from utils.basic_functions import calculate_diversity_masks
+
+
+def greedy_diverse_group(
+    pool: AgentPool, candidates: np.ndarray, team_size: int
+) -> list[int]:
+    """Greedily selects team_size agents from the candidates (ids in the pool), each
+    time adding an agent with the maximal cumulative diversity to the agents selected
+    so far, where ties are broken uniformly at random."""
+    masks = pool.masks[candidates]
+    cumulative_diversity = np.zeros(len(candidates))
+    available = np.ones(len(candidates), dtype=bool)
+    diverse_group = []
+    for _ in range(team_size):
+        max_diversity = cumulative_diversity[available].max()
+        new_member = rd.choice(
+            np.flatnonzero(available & (cumulative_diversity == max_diversity))
+        )
+        diverse_group.append(int(candidates[new_member]))
+        available[new_member] = False
+        cumulative_diversity += calculate_diversity_masks(masks, masks[new_member])
+    return diverse_group
 
 
 def generate_expert_team(sources: Sources, heuristic_size: int | list, team_size: int):
-    if not isinstance(heuristic_size, list):
-        heuristic_size = [heuristic_size]
-
-    all_heuristics = it.chain.from_iterable(
-        sources.all_heuristics(size) for size in heuristic_size
-    )
-    possible_agents = [
-        Agent(id, heuristic, sources) for id, heuristic in enumerate(all_heuristics)
-    ]
-
-    agent_score_tuples = [[agent, agent.score] for agent in possible_agents]
-    agent_score_tuples.sort(key=lambda item: item[1], reverse=True)
-    best_agents = [agent for [agent, _] in agent_score_tuples[:team_size]]
+    pool = get_agent_pool(sources, heuristic_size)
+    best_agents = pool.agents(pool.top(team_size), sources)
     return Team(best_agents, sources)
 
 
 def generate_diverse_team(sources: Sources, heuristic_size: int | list, team_size: int):
-    if not isinstance(heuristic_size, list):
-        heuristic_size = [heuristic_size]
-
-    all_heuristics = it.chain.from_iterable(
-        sources.all_heuristics(size) for size in heuristic_size
-    )
-    possible_agents = [
-        Agent(id, heuristic, sources) for id, heuristic in enumerate(all_heuristics)
-    ]
-
-    diversity_dict: dict[Agent, float] = {agent: 0 for agent in possible_agents}
-    diverse_group = []
-    for _ in range(team_size):
-        max_diversity = max(diversity_dict.values())
-        new_member = rd.choice(
-            [
-                agent
-                for (agent, diversity) in diversity_dict.items()
-                if diversity == max_diversity
-            ]
-        )
-        diverse_group.append(new_member)
-        diversity_dict.pop(new_member)
-        for agent in diversity_dict.keys():
-            diversity_dict[agent] += calculate_diversity(
-                agent.heuristic, new_member.heuristic
-            )
-    return Team(diverse_group, sources)
+    pool = get_agent_pool(sources, heuristic_size)
+    diverse_group = greedy_diverse_group(pool, pool.ids, team_size)
+    return Team(pool.agents(diverse_group, sources), sources)
 
 
 def generate_random_team(sources: Sources, heuristic_size: int | list, team_size: int):
-    if not isinstance(heuristic_size, list):
-        heuristic_size = [heuristic_size]
-
-    all_heuristics = it.chain.from_iterable(
-        sources.all_heuristics(size) for size in heuristic_size
-    )
-    possible_agents = [
-        Agent(id, heuristic, sources) for id, heuristic in enumerate(all_heuristics)
-    ]
-
-    random_group = rd.sample(possible_agents, team_size)
-    return Team(random_group, sources)
+    pool = get_agent_pool(sources, heuristic_size)
+    random_group = rd.sample(range(len(pool)), team_size)
+    return Team(pool.agents(random_group, sources), sources)
 
 
 def generate_qualified_diverse_team(
@@ -79,40 +54,11 @@ def generate_qualified_diverse_team(
     team_size: int,
     qualifying_percentile: float,
 ):
-    if not isinstance(heuristic_size, list):
-        heuristic_size = [heuristic_size]
-
-    all_heuristics = it.chain.from_iterable(
-        sources.all_heuristics(size) for size in heuristic_size
-    )
-    possible_agents = [
-        Agent(id, heuristic, sources) for id, heuristic in enumerate(all_heuristics)
-    ]
-
-    agent_scores = [agent.score for agent in possible_agents]
-    qualifying_score = np.percentile(agent_scores, qualifying_percentile)
-    qualified_agents = [
-        agent for agent in possible_agents if agent.score >= qualifying_score
-    ]
-
-    diversity_dict: dict[Agent, float] = {agent: 0 for agent in qualified_agents}
-    diverse_group = []
-    for _ in range(team_size):
-        max_diversity = max(diversity_dict.values())
-        new_member = rd.choice(
-            [
-                agent
-                for (agent, diversity) in diversity_dict.items()
-                if diversity == max_diversity
-            ]
-        )
-        diverse_group.append(new_member)
-        diversity_dict.pop(new_member)
-        for agent in diversity_dict.keys():
-            diversity_dict[agent] += calculate_diversity(
-                agent.heuristic, new_member.heuristic
-            )
-    return Team(diverse_group, sources)
+    pool = get_agent_pool(sources, heuristic_size)
+    qualifying_score = pool.percentile(qualifying_percentile)
+    qualified_agents = np.flatnonzero(pool.scores >= qualifying_score)
+    diverse_group = greedy_diverse_group(pool, qualified_agents, team_size)
+    return Team(pool.agents(diverse_group, sources), sources)
 
 
 if __name__ == "__main__":
@@ -1,8 +1,10 @@
 import concurrent.futures
 import itertools
 import math
+import os
 import random
 import sys
+import warnings
 
 import numpy as np
 import pandas as pd
@@ -13,33 +15,66 @@ import pandas as pd
 class Landscape:
     """
     From https://github.com/alicecwhuang/noisy-search/tree/master.
+
+    A piecewise-linear landscape: round(length / smoothness) random points (heights
+    1 to 100) are connected by segments of random length 1 to 2 * smoothness - 1,
+    where the heights are capped at 100. The heights are stored as a float array.
     """
 
-    def __init__(self, smoothness, length=10):
+    def __init__(
+        self,
+        smoothness,
+        length=10,
+        rng: np.random.Generator | None = None,
+        heights: np.ndarray | None = None,
+    ):
 
         self.s = smoothness
-        self.length = length
-
-        """Generate landscape heights"""
-        total_segments = round(self.length / self.s)
-        points = [random.choice(range(1, 101))]  # points that define landscape
-        heights = []  # full landscape
-
-        for j in range(total_segments - 1):
-            a = points[-1]
-            b = random.choice(range(1, 101))  # new random point to define landscape
-            points.append(b)
-            seg_len = random.choice(range(1, 2 * self.s))
-            """Fill in locations between two points"""
-            step = np.round((b - a) / seg_len, 2)
-            for i in range(1, seg_len + 1):
-                if a + step * i > 100:
-                    heights.append(100)
-                else:
-                    heights.append(a + step * i)
-
+        if heights is None:
+            heights = generate_heights(smoothness, length, 1, rng)[0]
         self.heights = heights
         self.length = len(self.heights)
+        # Noiseless scores of heuristics (see heuristic_scores), cached per landscape
+        self.scores: dict[tuple, np.ndarray] = {}
+
+    @classmethod
+    def batch(
+        cls,
+        smoothness,
+        n_landscapes: int,
+        length=10,
+        rng: np.random.Generator | None = None,
+    ) -> list["Landscape"]:
+        """Generates n_landscapes landscapes in one batched call."""
+        return [
+            cls(smoothness, heights=heights)
+            for heights in generate_heights(smoothness, length, n_landscapes, rng)
+        ]
+
+
+def generate_heights(
+    smoothness, length, n_landscapes: int = 1, rng: np.random.Generator | None = None
+) -> list[np.ndarray]:
+    """Generates the heights of n_landscapes landscapes at once."""
+    if rng is None:
+        rng = np.random.default_rng()
+    n_segments = max(round(length / smoothness) - 1, 0)
+    if n_segments == 0:
+        return [np.zeros(0) for _ in range(n_landscapes)]
+    points = rng.integers(1, 101, size=(n_landscapes, n_segments + 1))
+    seg_lens = rng.integers(1, 2 * smoothness, size=(n_landscapes, n_segments))
+    steps = np.round((points[:, 1:] - points[:, :-1]) / seg_lens, 2)
+
+    """Fill in locations between two points of all segments"""
+    seg_lens = seg_lens.ravel()
+    ends = np.cumsum(seg_lens)
+    i = np.arange(1, ends[-1] + 1) - np.repeat(ends - seg_lens, seg_lens)
+    heights = (
+        np.repeat(points[:, :-1].ravel(), seg_lens)
+        + np.repeat(steps.ravel(), seg_lens) * i
+    )
+    heights = np.minimum(heights, 100.0)
+    return np.split(heights, ends[n_segments - 1 :: n_segments][:-1])
 
 
 class Agent:
@@ -54,15 +89,18 @@ class Agent:
         """Get noisy data from location"""
         return max(np.random.normal(self.landscape.heights[loc], self.sigma), 0.001)
 
-    def search(self, start, own_hist, in_hist):
+    def search(self, start, own_hist, in_hist, record=None):
         """own_hist records agent's own search results"""
         """in_hist records known results by the ingroup"""
+        """record (if a list) receives each recorded loc with its previous value"""
         start = start  # Starting location on landscape
         loc = start  # Current location
         findings = own_hist
         if in_hist[loc] == 0:
             """Starting loc hasn't been searched by ingroup members"""
             value = self.data(loc)
+            if record is not None:
+                record.append((loc, findings[loc]))
             findings[loc], maxi = value, value
         else:
             """Starting loc has been searched by ingroup members"""
@@ -78,6 +116,8 @@ class Agent:
             if in_hist[nxt] == 0:
                 """Never checked by ingroup"""
                 value = self.data(nxt)
+                if record is not None:
+                    record.append((nxt, findings[nxt]))
                 findings[nxt], in_hist[nxt] = value, value
                 if maxi < value:
                     """Found value higher than current one"""
@@ -97,6 +137,102 @@ class Agent:
                     n_total += 1
         return findings
 
+    def search_all_starts(self, rng: np.random.Generator | None = None) -> np.ndarray:
+        """Searches from every starting location at once, without ingroup, and
+        returns the findings (row i holds the own history of the search from i). The
+        searches advance in lockstep on arrays and follow search exactly: findings
+        are truncated to integers, the step size is h[n_total % 3] and the starting
+        location is not recorded in the ingroup history (so it may be probed again).
+        The noise of all probes in a step is drawn at once."""
+        if rng is None:
+            rng = np.random.default_rng()
+        length = self.landscape.length
+        heights = np.asarray(self.landscape.heights, dtype=float)
+        h = np.asarray(self.h)
+        starts = np.arange(length)
+
+        def data(locs):
+            if self.sigma == 0:
+                return heights[locs]
+            return np.maximum(rng.normal(heights[locs], self.sigma), 0.001)
+
+        findings = np.zeros((length, length), dtype=np.int32)
+        maxi = data(starts)
+        findings[starts, starts] = maxi
+        # The own history equals the ingroup history, except at the starting location
+        # until it is probed again
+        start_recorded = np.zeros(length, dtype=bool)
+        loc = starts.copy()
+        count = np.zeros(length, dtype=int)
+        n_total = np.zeros(length, dtype=int)
+
+        active = starts
+        while len(active) > 0:
+            nxt = (loc[active] + h[n_total[active] % 3]) % length
+            values = findings[active, nxt].astype(float)
+            fresh = (values == 0) | ((nxt == active) & ~start_recorded[active])
+            """Locations never checked by ingroup"""
+            values[fresh] = data(nxt[fresh])
+            findings[active[fresh], nxt[fresh]] = values[fresh]
+            start_recorded[active[fresh & (nxt == active)]] = True
+
+            improved = maxi[active] < values
+            loc[active[improved]] = nxt[improved]
+            maxi[active[improved]] = values[improved]
+            count[active] = np.where(improved, 0, count[active] + 1)
+            n_total[active] += 1
+            active = active[count[active] < len(h)]
+        return findings
+
+    def search_batch(self, rows, starts, own_hist, in_hist, rng=None, record=None):
+        """Runs search from starts[j] on the histories own_hist[rows[j]] and
+        in_hist[rows[j]] for all j at once, advancing the searches in lockstep.
+        record (if a list) receives the rows, locs, previous and new values of each
+        batch of recorded findings."""
+        if rng is None:
+            rng = np.random.default_rng()
+        length = self.landscape.length
+        heights = np.asarray(self.landscape.heights, dtype=float)
+        h = np.asarray(self.h)
+
+        def data(locs):
+            if self.sigma == 0:
+                return heights[locs]
+            return np.maximum(rng.normal(heights[locs], self.sigma), 0.001)
+
+        def write(r, locs, values):
+            previous = own_hist[r, locs]
+            own_hist[r, locs] = values
+            if record is not None:
+                record.append((r, locs, previous, own_hist[r, locs]))
+
+        maxi = in_hist[rows, starts].astype(float)
+        """Starting locs that haven't been searched by ingroup members"""
+        fresh = maxi == 0
+        maxi[fresh] = data(starts[fresh])
+        write(rows[fresh], starts[fresh], maxi[fresh])
+        loc = np.array(starts)
+        count = np.zeros(len(rows), dtype=int)
+        n_total = np.zeros(len(rows), dtype=int)
+
+        active = np.arange(len(rows))
+        while len(active) > 0:
+            r = rows[active]
+            nxt = (loc[active] + h[n_total[active] % 3]) % length
+            values = in_hist[r, nxt].astype(float)
+            fresh = values == 0
+            """Never checked by ingroup"""
+            values[fresh] = data(nxt[fresh])
+            write(r[fresh], nxt[fresh], values[fresh])
+            in_hist[r[fresh], nxt[fresh]] = values[fresh]
+
+            improved = maxi[active] < values
+            loc[active[improved]] = nxt[improved]
+            maxi[active[improved]] = values[improved]
+            count[active] = np.where(improved, 0, count[active] + 1)
+            n_total[active] += 1
+            active = active[count[active] < len(h)]
+
 
 class Team:
     def __init__(self, members, landscape, trust_level=1):
@@ -116,34 +252,120 @@ class Team:
                 for b in subgroup:
                     self.trust[b] = subgroup
 
-    def aggregate(self, maps):
+    def groups(self):
+        """Returns the index of each member's trusted subgroup and the number of
+        subgroups"""
+        index = {a: i for i, a in enumerate(self.members)}
+        group_keys = [
+            tuple(sorted(index[n] for n in self.trust[a])) for a in self.members
+        ]
+        group_ids = {key: g for g, key in enumerate(dict.fromkeys(group_keys))}
+        return [group_ids[key] for key in group_keys], len(group_ids)
+
+    def aggregate(self, num, denom):
         """Aggregate search results from multiple agents"""
-        denom = np.sum([np.where(m > 0, 1, 0) for m in maps.values()], axis=0)
-        num = np.sum([m for m in maps.values()], axis=0)
         return num / (denom + np.where(denom == 0, 1, 0))
 
     def tournament(self, start):
-        maps = dict()  # Cumulative search results by members
-        for a in self.members:
-            maps[a] = np.array([0] * self.landscape.length)
+        """Runs the tournament from start, one search at a time. This is the
+        reference implementation of tournament_all_starts, which the simulations use,
+        and it is kept to check that both agree for sigma = 0.
+
+        The search results of the members are the rows of maps. The sums of the
+        results per trusted subgroup (the members' in_hist) and the sum and number of
+        results per location over all members (for aggregate) are updated with the
+        new findings of each search, rather than recomputed from maps."""
+        n_members = len(self.members)
+        maps = np.zeros((n_members, self.landscape.length), dtype=int)
+        group_of, n_groups = self.groups()
+        group_sums = np.zeros((n_groups, self.landscape.length), dtype=int)
+        num = np.zeros(self.landscape.length, dtype=int)
+        denom = np.zeros(self.landscape.length, dtype=int)
         on = True
         maxi = 0  # Current max value found
         loc = start  # Location where current max value is found
 
         while on:
-            for m in self.members:
-                in_hist = np.sum([maps[n] for n in self.trust[m]], axis=0)
-                maps[m] = m.search(loc, maps[m], in_hist)
+            for i, m in enumerate(self.members):
+                in_hist = group_sums[group_of[i]]
+                start_fresh = in_hist[loc] == 0
+                record = []
+                m.search(loc, maps[i], in_hist, record)
+                """search records new findings in in_hist, except at the start"""
+                if start_fresh:
+                    in_hist[loc] = maps[i, loc]
+                previous = {}
+                for x, value in record:
+                    previous.setdefault(x, value)
+                for x, value in previous.items():
+                    num[x] += maps[i, x] - value
+                    denom[x] += int(maps[i, x] > 0) - int(value > 0)
 
             on = False
-            new_max, new_loc = np.amax(self.aggregate(maps)), np.argmax(
-                self.aggregate(maps)
-            )
+            aggregate = self.aggregate(num, denom)
+            new_max, new_loc = np.amax(aggregate), np.argmax(aggregate)
             if new_max > maxi:
                 on = True  # Continue if higher value found in new round
                 loc, maxi = new_loc, new_max
 
-        return self.landscape.heights[np.argmax(self.aggregate(maps))]
+        return self.landscape.heights[np.argmax(aggregate)]
+
+    def tournament_all_starts(self, starts=None, rng=None, batch_size=None):
+        """Runs the tournaments from all starts (by default all locations) at once, in
+        batches of batch_size starts, and returns their results. The tournaments
+        advance in lockstep on starts x members x L arrays: in each round every
+        member searches from the current location of all unfinished tournaments
+        (see Agent.search_batch), and finished tournaments are masked. For sigma = 0
+        the results equal those of tournament (the reference implementation)."""
+        length = self.landscape.length
+        if starts is None:
+            starts = np.arange(length)
+        if batch_size is None:
+            batch_size = max(1, 2**24 // (len(self.members) * max(length, 1)))
+        if rng is None:
+            rng = np.random.default_rng()
+        results = np.empty(len(starts))
+        for k in range(0, len(starts), batch_size):
+            batch = np.asarray(starts[k : k + batch_size])
+            results[k : k + batch_size] = self._tournament_batch(batch, rng)
+        return results
+
+    def _tournament_batch(self, starts, rng):
+        n_starts, length = len(starts), self.landscape.length
+        heights = np.asarray(self.landscape.heights)
+        maps = np.zeros((n_starts, len(self.members), length), dtype=int)
+        group_of, n_groups = self.groups()
+        group_sums = np.zeros((n_starts, n_groups, length), dtype=int)
+        num = np.zeros((n_starts, length), dtype=int)
+        denom = np.zeros((n_starts, length), dtype=int)
+        aggregate = np.zeros((n_starts, length))  # Updated with num and denom
+        maxi = np.zeros(n_starts)  # Current max value found
+        loc = np.array(starts)  # Location where current max value is found
+        results = np.empty(n_starts)
+
+        rows = np.arange(n_starts)  # Unfinished tournaments
+        while len(rows) > 0:
+            for i, m in enumerate(self.members):
+                in_hist = group_sums[:, group_of[i]]
+                start_fresh = rows[in_hist[rows, loc[rows]] == 0]
+                record = []
+                m.search_batch(rows, loc[rows], maps[:, i], in_hist, rng, record)
+                """search records new findings in in_hist, except at the start"""
+                in_hist[start_fresh, loc[start_fresh]] = maps[
+                    start_fresh, i, loc[start_fresh]
+                ]
+                for r, x, previous, value in record:
+                    num[r, x] += value - previous
+                    denom[r, x] += (value > 0).astype(int) - (previous > 0)
+                    aggregate[r, x] = self.aggregate(num[r, x], denom[r, x])
+
+            new_max = aggregate[rows].max(axis=1)
+            new_loc = aggregate[rows].argmax(axis=1)
+            on = new_max > maxi[rows]  # Continue if higher value found in new round
+            results[rows[~on]] = heights[new_loc[~on]]
+            loc[rows[on]], maxi[rows[on]] = new_loc[on], new_max[on]
+            rows = rows[on]
+        return results
 
 
 poolsize = 9
@@ -154,35 +376,60 @@ all_perm = list(itertools.permutations(pool, r=h_each))  # All possible step siz
 
 
 def calc_score(a, L):
-    """Calculate agent's avg search score from all starting points of landscape"""
+    """Calculate agent's avg search score from all starting points of landscape
+    (NaN if the landscape is empty, as the baseline mean of no results)"""
+    if L.length == 0:
+        a.score = np.nan
+        return
+    results = a.search_all_starts()
+    a.score = np.mean(np.asarray(L.heights)[np.argmax(results, axis=1)])
+
+
+def _scores_chunk(task):
+    L, heuristics = task
     scores = []
-    for i in range(L.length):
-        np.random.seed()
-        results = a.search(i, np.array([0] * L.length), np.array([0] * L.length))
-        score = L.heights[np.argmax(results)]
-        scores.append(score)
-    a.score = np.mean(scores)
+    for h in heuristics:
+        a = Agent(0, h, L, sigma=0)
+        calc_score(a, L)
+        scores.append(a.score)
+    return scores
+
+
+def heuristic_scores(L, heuristics=all_perm, n_jobs=1) -> np.ndarray:
+    """Returns the noiseless search scores of the heuristics on landscape L, which
+    are computed once per landscape and cached on it. The heuristics are scored on
+    n_jobs processes (all cores if None), which pays off for large pools of step
+    sizes and long landscapes."""
+    key = tuple(heuristics)
+    if key not in L.scores:
+        if n_jobs == 1:
+            scores = _scores_chunk((L, heuristics))
+        else:
+            n_chunks = 4 * (n_jobs or os.cpu_count() or 1)
+            with concurrent.futures.ProcessPoolExecutor(n_jobs) as executor:
+                chunks = [(L, heuristics[k::n_chunks]) for k in range(n_chunks)]
+                scores = np.empty(len(heuristics))
+                for k, chunk_scores in enumerate(executor.map(_scores_chunk, chunks)):
+                    scores[k::n_chunks] = chunk_scores
+        L.scores[key] = np.asarray(scores, dtype=float)
+    return L.scores[key]
 
 
-def find_experts(L, t):
+def find_experts(L, t, heuristics=all_perm, n_jobs=1):
     """Returns agents with top individual search scores"""
-    agents = []  # all possible heuristic profiles
-    for i in range(len(all_perm)):
-        a = Agent(i, all_perm[i], L, sigma=0)
+    scores = heuristic_scores(L, heuristics, n_jobs)
+    ranking = np.argsort(-scores, kind="stable")  # sort agents by expertise
+    agents = []
+    for i in ranking[:per_team]:
+        a = Agent(int(i), heuristics[i], L, sigma=0)
+        a.score = scores[i]
         agents.append(a)
-    if __name__ == "__main__":
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            r = [executor.submit(calc_score, a, L) for a in agents]
-    agents.sort(key=lambda x: x.score, reverse=True)  # sort agents by expertise
-    return Team(agents[:per_team], L, trust_level=t)
-
+    return Team(agents, L, trust_level=t)
 
-def tournament(team, i):
-    np.random.seed()
-    return team.tournament(i)
 
-
-def run(s, t, sigma=8):
+def run(s, t, sigma=8, L=None, rng=None):
+    """Compares a diverse and an expert team on landscape L, a new landscape with
+    smoothness s if None. The noise of the tournaments is drawn from rng."""
     # cols = [
     #     "smoothness",
     #     "diverse",
@@ -195,7 +442,8 @@ def run(s, t, sigma=8):
     # ]
     # df = pd.DataFrame(columns=cols)
 
-    L = Landscape(s)
+    if L is None:
+        L = Landscape(s)
 
     expert = find_experts(L, t)
     for e in expert.members:
@@ -207,26 +455,20 @@ def run(s, t, sigma=8):
         L,
         trust_level=t,
     )
-    d_record = []
-    x_record = []
-
-    if __name__ == "__main__":
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            results = [executor.submit(tournament, diverse, i) for i in range(L.length)]
-
-            for f in concurrent.futures.as_completed(results):
-                d_record.append(f.result())
-
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            results = [executor.submit(tournament, expert, i) for i in range(L.length)]
-
-            for f in concurrent.futures.as_completed(results):
-                x_record.append(f.result())
+    # The tournaments from all starts run in lockstep, parallelism is over
+    # landscapes (see EnsembleSimulation)
+    d_record = diverse.tournament_all_starts(rng=rng)
+    x_record = expert.tournament_all_starts(rng=rng)
+    # An empty landscape (round(length / s) < 2) has no starts: the scores are NaN
+    if L.length == 0:
+        d_score, x_score = np.nan, np.nan
+    else:
+        d_score, x_score = np.mean(d_record), np.mean(x_record)
 
     data = [
         L.s,
-        np.mean(d_record),
-        np.mean(x_record),
+        d_score,
+        x_score,
         list(itertools.chain.from_iterable([a.h for a in diverse.members])),
         list(itertools.chain.from_iterable([a.h for a in expert.members])),
         t,
@@ -273,25 +515,161 @@ class Simulation:
         ]
         df = pd.DataFrame(columns=cols)
 
+        # One landscape per smoothness, so that the expert ranking is computed once
+        # and reused for all trust levels and noise levels
+        landscapes = {s: Landscape(s) for s in self.Smoothness}
         for k, (s, t, sigma) in enumerate(self.grid):
-            df.loc[k] = run(s, t, sigma)
+            df.loc[k] = run(s, t, sigma, landscapes[s])
 
         return df
 
 
+def _ensemble_task(task):
+    """Runs all cells (k, t, sigma) of smoothness s on landscape r, so that its expert
+    ranking is computed once. The landscape and the randomness of each cell are
+    seeded."""
+    s, seed, r, length, cells = task
+    L = Landscape(s, length, rng=np.random.default_rng([seed, s, r]))
+    results = []
+    for k, t, sigma in cells:
+        # Seeded per cell, so that the results do not depend on n_jobs
+        random.seed(f"{seed}-{k}-{r}")
+        data = run(s, t, sigma, L, rng=np.random.default_rng([seed, k, r]))
+        results.append((k, data[1], data[2]))
+    return results
+
+
+class EnsembleSimulation:
+    """
+    Runs the grid of (smoothness, trust, sigma) cells on n_landscapes seeded
+    landscapes per cell. The landscapes only depend on the seed and the smoothness, so
+    all cells with the same smoothness use the same landscapes: each task runs these
+    cells on one landscape, and the tasks are distributed over a process pool. The
+    noise of the tournaments is seeded as well. A summary of each cell is appended to
+    the csv file as soon as the cell is complete, and cells already in the file are
+    skipped. Cells whose landscapes are empty (round(length / s) < 2) are written with
+    NaN scores. A task that fails is reported with a warning and does not stop the
+    other tasks; its cells are not written, so they are run again next time. The
+    shard (index, count) runs every count-th cell starting at index, so that several
+    machines can split the grid.
+    """
+
+    columns = [
+        "smoothness",
+        "trust",
+        "sigma",
+        "poolsize",
+        "n_landscapes",
+        "diverse",
+        "expert",
+        "diverse_std",
+        "expert_std",
+        "diverse_better",
+        "seed",
+    ]
+
+    def __init__(
+        self,
+        Smoothness: list,
+        Sigma: list,
+        Trust: list,
+        n_landscapes: int = 100,
+        length: int = 10,
+        seed: int = 0,
+    ) -> None:
+        self.Smoothness = Smoothness
+        self.Sigma = Sigma
+        self.Trust = Trust
+        self.n_landscapes = n_landscapes
+        self.length = length
+        self.seed = seed
+        self.grid = [
+            (s, t, sigma)
+            for s in self.Smoothness
+            for t in self.Trust
+            for sigma in self.Sigma
+        ]
+
+    def cells(self, filename_csv, shard=(0, 1)) -> list[int]:
+        """Returns the cells of the shard that are not yet in the csv file."""
+        index, count = shard
+        done = set()
+        if os.path.exists(filename_csv):
+            df = pd.read_csv(filename_csv)
+            done = set(zip(df["smoothness"], df["trust"], df["sigma"]))
+        return [
+            k
+            for k, cell in enumerate(self.grid)
+            if k % count == index and cell not in done
+        ]
+
+    def summary(self, k, diverse, expert) -> list:
+        s, t, sigma = self.grid[k]
+        diverse, expert = np.array(diverse), np.array(expert)
+        return [
+            s,
+            t,
+            sigma,
+            poolsize,
+            len(diverse),
+            diverse.mean(),
+            expert.mean(),
+            diverse.std(),
+            expert.std(),
+            np.nan if np.isnan(diverse).any() else np.mean(diverse > expert),
+            self.seed,
+        ]
+
+    def run(
+        self, filename_csv="data/landscape_ensemble.csv", shard=(0, 1), n_jobs=None
+    ):
+        cells = self.cells(filename_csv, shard)
+        cells_per_smoothness = {}
+        for k in cells:
+            s, t, sigma = self.grid[k]
+            cells_per_smoothness.setdefault(s, []).append((k, t, sigma))
+        tasks = [
+            (s, self.seed, r, self.length, cells_s)
+            for s, cells_s in cells_per_smoothness.items()
+            for r in range(self.n_landscapes)
+        ]
+        records = {k: ([], []) for k in cells}
+        with concurrent.futures.ProcessPoolExecutor(n_jobs) as executor:
+            futures = {executor.submit(_ensemble_task, task): task for task in tasks}
+            for f in concurrent.futures.as_completed(futures):
+                try:
+                    results = f.result()
+                except Exception as error:
+                    s, _, r, _, _ = futures[f]
+                    warnings.warn(
+                        f"Landscape {r} of smoothness {s} failed ({error!r}), its "
+                        "cells are not written."
+                    )
+                    continue
+                for k, diverse, expert in results:
+                    records[k][0].append(diverse)
+                    records[k][1].append(expert)
+                    if len(records[k][0]) == self.n_landscapes:
+                        row = pd.DataFrame(
+                            [self.summary(k, *records.pop(k))], columns=self.columns
+                        )
+                        header = not os.path.exists(filename_csv)
+                        row.to_csv(filename_csv, mode="a", header=header, index=False)
+
+
 if __name__ == "__main__":
     Smoothness = range(1, 9)
     Sigma = [0]
     # Sigma = [0, 4, 8, 12]
     Trust = [1]
     # Trust = [0, 0.33, 0.5, 1]
-    Simulation(Smoothness, Sigma, Trust).simulation().to_csv("data/landscape.csv")
-
-    # if len(sys.argv) != 4:
-    #     print("error")
-    #     sys.exit(1)
 
-    # s = int(sys.argv[1])
-    # t = float(sys.argv[2])
-    # sigma = float(sys.argv[3])
-    # run(s, t, sigma)
+    # Optionally run a shard of the grid: python -m models.landscape_model index count
+    if len(sys.argv) not in (1, 3):
+        print("usage: python -m models.landscape_model [shard_index shard_count]")
+        sys.exit(1)
+    shard = (int(sys.argv[1]), int(sys.argv[2])) if len(sys.argv) == 3 else (0, 1)
+    filename_csv = "data/landscape_ensemble.csv"
+    if shard[1] > 1:
+        filename_csv = f"data/landscape_ensemble_{shard[0]}of{shard[1]}.csv"
+    EnsembleSimulation(Smoothness, Sigma, Trust).run(filename_csv, shard)
@@ -3,13 +3,17 @@ import numpy as np
 import utils.config as cfg
 from models.agent import Agent
 from models.sources import Sources
+from utils.accuracy_cache import accuracy_cache, reliabilities_fingerprint
 from utils.basic_functions import (
-    calculate_accuracy_precision_proportion,
     calculate_competence,
+    calculate_competence_opinion,
+    calculate_competence_opinion_dp,
     calculate_competence_with_duplicates,
-    calculate_diversity,
+    calculate_team_competences,
+    estimate_competence_opinion,
+    estimate_competence_with_duplicates,
     majority_winner,
-    powerset,
+    masks_to_membership,
 )
 
 
@@ -25,6 +29,14 @@ class Team:
             The sources that the team could access.
         size (int):
             The size of the team.
+        masks (np.array[np.uint64]):
+            The members’ heuristics as bitmasks.
+        membership (np.array[bool]):
+            The matrix of members by sources, entry [i, s] is True iff member i has
+            access to source s.
+        sample_sizes (dict):
+            The number of samples used by the last estimate of the accuracy for the
+            opinion-based and boundedly rational dynamics (None when computed exactly).
 
     Methods
     -------
@@ -34,12 +46,54 @@ class Team:
             Returns the accuracy for the evidence-based dynamics.
         accuracy_bounded:
             Returns the accuracy for the boundedly rational evidence-based dynamics.
+        accuracies:
+            Returns the accuracies for the three dynamics in a single evaluation.
+
+    Exactly computed accuracies are cached per process by canonical team (see
+    canonical_key), so that teams with the same heuristics are only evaluated once.
     """
 
     def __init__(self, members: list[Agent], sources: Sources):
-        self.members = members
         self.sources = sources
-        self.size = len(self.members)
+        self.members = members
+        self.sample_sizes: dict[str, int | None] = {"opinion": None, "bounded": None}
+
+    @property
+    def members(self) -> list[Agent]:
+        return self._members
+
+    @members.setter
+    def members(self, members: list[Agent]) -> None:
+        """Setting the members resets the metrics that are memoized in _cache."""
+        self._members = members
+        self.size = len(members)
+        self.masks = np.array([agent.mask for agent in members], dtype=np.uint64)
+        self.membership = masks_to_membership(self.masks, self.sources.n_sources)
+        self._cache: dict = {}
+
+    def source_counts(self) -> np.ndarray:
+        """Returns the number of members that have access to each source."""
+        if "source_counts" not in self._cache:
+            self._cache["source_counts"] = self.membership.sum(axis=0)
+        return self._cache["source_counts"]
+
+    def canonical_key(self) -> tuple:
+        """Returns the key identifying the team up to the order of its members: the
+        sorted heuristics as bitmasks and the fingerprint of the reliabilities."""
+        if "canonical_key" not in self._cache:
+            self._cache["canonical_key"] = (
+                tuple(sorted(int(mask) for mask in self.masks)),
+                reliabilities_fingerprint(self.sources.reliabilities),
+            )
+        return self._cache["canonical_key"]
+
+    def cached_accuracy(self, method: str, calculate) -> float:
+        """Returns the cached accuracy for method or calculates and caches it."""
+        accuracy = accuracy_cache.get(self.canonical_key(), method)
+        if accuracy is None:
+            accuracy = float(calculate())
+            accuracy_cache.put(self.canonical_key(), method, accuracy)
+        return accuracy
 
     def aggregate(self):
         return majority_winner([agent.opinion for agent in self.members])
@@ -48,99 +102,140 @@ class Team:
         for agent in self.members:
             agent.update_opinion()
 
+    def relevant_membership(self) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the sources accessed by some member and the boolean matrix of
+        members by these sources."""
+        sources_relevant = np.flatnonzero(self.source_counts())
+        return sources_relevant, self.membership[:, sources_relevant]
+
     def accuracy_evidence(self) -> float:
-        sources_accessed = np.unique(
-            np.array(
-                [source for agent in self.members for source in agent.heuristic]
-            ).flatten()
-        )
+        sources_accessed = np.flatnonzero(self.source_counts())
         reliabilities = self.sources.reliabilities[sources_accessed]
-        return calculate_competence(reliabilities)
+        return self.cached_accuracy(
+            "evidence", lambda: calculate_competence(reliabilities)
+        )
 
     def accuracy_bounded(
-        self, estimate_sample_size: int | None = None
+        self,
+        estimate_sample_size: int | None = None,
+        target_precision: float | None = None,
     ) -> tuple[float, float | None]:
-        sources_accessed = np.array(
-            [source for agent in self.members for source in agent.heuristic]
-        ).flatten()
-        sources_accessed, weights = np.unique(sources_accessed, return_counts=True)
+        """Estimates the accuracy by sampling if estimate_sample_size is an integer.
+        If target_precision is also given, samples are drawn until the confidence
+        interval is at most that wide and estimate_sample_size is the maximal number of
+        samples."""
+        sources_accessed = np.flatnonzero(self.source_counts())
+        weights = self.source_counts()[sources_accessed]
         reliabilities = self.sources.reliabilities[sources_accessed]
-        return calculate_competence_with_duplicates(
-            reliabilities, weights, estimate_sample_size
+        self.sample_sizes["bounded"] = None
+
+        # 1. Estimate by sampling if estimate_sample_size is integer
+        if isinstance(estimate_sample_size, int):
+            accuracy, precision, self.sample_sizes["bounded"] = (
+                estimate_competence_with_duplicates(
+                    reliabilities, weights, estimate_sample_size, target_precision
+                )
+            )
+            return accuracy, precision
+
+        # 2. Else calculate
+        accuracy = self.cached_accuracy(
+            "bounded",
+            lambda: calculate_competence_with_duplicates(reliabilities, weights)[0],
         )
+        return accuracy, None
 
     def accuracy_opinion(
-        self, estimate_sample_size: int | None = None
+        self,
+        estimate_sample_size: int | None = None,
+        target_precision: float | None = None,
     ) -> tuple[float, float | None]:
+        """Estimates the accuracy by sampling if estimate_sample_size is an integer.
+        If target_precision is also given, samples are drawn until the confidence
+        interval is at most that wide and estimate_sample_size is the maximal number of
+        samples."""
+        sources_relevant, membership = self.relevant_membership()
+        reliabilities = self.sources.reliabilities[sources_relevant]
+        self.sample_sizes["opinion"] = None
+
         # 1. Estimate by sampling if estimate_sample_size is integer
         if isinstance(estimate_sample_size, int):
-            outcomes = np.array([], dtype=float)
-            for _ in range(estimate_sample_size):
-                self.sources.update_valences()
-                self.update_opinions()
-                result = self.aggregate()
-                outcomes = np.append(outcomes, result)
-            estimated_accuracy, precision = calculate_accuracy_precision_proportion(
-                outcomes
+            accuracy, precision, self.sample_sizes["opinion"] = (
+                estimate_competence_opinion(
+                    reliabilities, membership, estimate_sample_size, target_precision
+                )
             )
-            return estimated_accuracy, precision
+            return accuracy, precision
 
         # 2. Else calculate
-        sources_relevant = np.unique(
-            np.array(
-                [source for agent in self.members for source in agent.heuristic]
-            ).flatten()
+        if len(sources_relevant) > cfg.max_sources_enumeration:
+            calculate = calculate_competence_opinion_dp
+        else:
+            calculate = calculate_competence_opinion
+        accuracy = self.cached_accuracy(
+            "opinion", lambda: calculate(reliabilities, membership)
         )
-        # sources_relevant = np.unique(sources_relevant.flatten())
-        # heuristics = [agent.heuristic for agent in self.members]
-        # sources_relevant = np.unique(heuristics.flatten())
-
-        accuracy = 0
-        for sources_positive in powerset(sources_relevant):
-            for source in self.sources.sources:
-                if source in sources_positive:
-                    self.sources.set_valence(source, cfg.vote_for_positive)
-                else:
-                    self.sources.set_valence(source, cfg.vote_for_negative)
-
-            self.update_opinions()
-            team_decision = majority_winner(
-                [agent.opinion for agent in self.members], return_value=False
+        return accuracy, None
+
+    def accuracies(
+        self,
+        estimate_sample_size: int | None = None,
+        target_precision: float | None = None,
+    ) -> dict:
+        """Returns the accuracies for the opinion-based, evidence-based and boundedly
+        rational dynamics together with the precision of the opinion-based accuracy.
+        When the opinion-based accuracy is computed by enumeration, the three
+        accuracies are computed in one traversal of the valence patterns. The
+        evidence-based and bounded accuracies are always exact."""
+        sources_relevant, membership = self.relevant_membership()
+        if (
+            estimate_sample_size is None
+            and len(sources_relevant) <= cfg.max_sources_enumeration
+        ):
+            self.sample_sizes["opinion"] = None
+            methods = ["opinion", "evidence", "bounded"]
+            accuracies = accuracy_cache.get_many(self.canonical_key(), methods)
+            if accuracies is None:
+                reliabilities = self.sources.reliabilities[sources_relevant]
+                accuracies = calculate_team_competences(reliabilities, membership)
+                for method, accuracy in zip(methods, accuracies):
+                    accuracy_cache.put(self.canonical_key(), method, float(accuracy))
+            accuracy_opinion, accuracy_evidence, accuracy_bounded = accuracies
+            precision_opinion = None
+        else:
+            accuracy_opinion, precision_opinion = self.accuracy_opinion(
+                estimate_sample_size, target_precision
             )
-
-            if len(team_decision) == 1 and cfg.vote_for_positive in team_decision:
-                probabilities_list = [
-                    self.sources.reliabilities[source] for source in sources_positive
-                ] + [
-                    1 - self.sources.reliabilities[source]
-                    for source in sources_relevant
-                    if source not in sources_positive
-                ]
-                probability_subset = np.prod(probabilities_list)
-                accuracy += probability_subset
-            elif len(team_decision) == 2:
-                probabilities_list = [
-                    self.sources.reliabilities[source] for source in sources_positive
-                ] + [
-                    1 - self.sources.reliabilities[source]
-                    for source in sources_relevant
-                    if source not in sources_positive
-                ]
-                probability_subset = np.prod(probabilities_list)
-                accuracy += probability_subset / 2
-        return float(accuracy), None
+            accuracy_evidence = self.accuracy_evidence()
+            accuracy_bounded, _ = self.accuracy_bounded()
+        return {
+            "accuracy_opinion": accuracy_opinion,
+            "precision_opinion": precision_opinion,
+            "accuracy_evidence": accuracy_evidence,
+            "accuracy_bounded": accuracy_bounded,
+        }
 
     def average(self) -> float:
-        return float(np.mean([agent.competence() for agent in self.members]))
+        if "average" not in self._cache:
+            self._cache["average"] = float(
+                np.mean([agent.score for agent in self.members])
+            )
+        return self._cache["average"]
 
     def diversity(self) -> float:
-        diversity_scores = [
-            calculate_diversity(agent1.heuristic, agent2.heuristic)
-            for agent1 in self.members
-            for agent2 in self.members
-            if agent1 != agent2
-        ]
-        return sum(diversity_scores) / (self.size * (self.size - 1))
+        """The average diversity of pairs of distinct members, computed from the Gram
+        matrix of the membership matrix (the overlaps of the members’ heuristics)."""
+        if "diversity" not in self._cache:
+            membership = self.membership.astype(int)
+            overlaps = membership @ membership.T
+            sizes = np.diag(overlaps)
+            novelty = (sizes[:, None] - overlaps) / sizes[:, None]
+            diversity_scores = (novelty + novelty.T) / 2
+            self._cache["diversity"] = float(
+                (diversity_scores.sum() - np.trace(diversity_scores))
+                / (self.size * (self.size - 1))
+            )
+        return self._cache["diversity"]
 
     def problem_difficulty(self) -> float:
         return self.sources.problem_difficulty()
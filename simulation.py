@@ -1,12 +1,14 @@
-import copy
 import itertools as it
+import os
 import time
 from concurrent.futures import ProcessPoolExecutor as Pool
-from functools import partial
+from concurrent.futures import as_completed
 
+import numpy as np
 import pandas as pd
 from tqdm.auto import tqdm
 
+from models.agent_pool import get_agent_pool
 from models.generate_teams import (
     generate_diverse_team,
     generate_expert_team,
@@ -14,6 +16,84 @@ from models.generate_teams import (
     generate_random_team,
 )
 from models.sources import Sources
+from models.team import Team
+from utils.accuracy_cache import accuracy_cache
+from utils.results_store import ResultsStore
+
+OUTCOME_COLUMNS = [
+    "team_type",
+    "sample",
+    "accuracy_opinion",
+    "precision_opinion",
+    "sample_size_opinion",
+    "accuracy_evidence",
+    "accuracy_bounded",
+    "diversity",
+    "average",
+]
+
+# The simulations of a worker process, set once by the pool initializer
+_worker_simulations: list = []
+
+
+def _init_worker(simulations: list["Simulation"]) -> None:
+    global _worker_simulations
+    _worker_simulations = simulations
+    # Forked workers inherit NumPy's global random state (random is reseeded by
+    # Python itself), which would make them draw the same samples
+    np.random.seed()
+    for simulation in simulations:
+        get_agent_pool(simulation.sources, simulation.heuristic_size)
+
+
+def _simulate_chunk(task: tuple[int, str, tuple]) -> list[tuple]:
+    cell, team_type, samples = task
+    simulation: Simulation = _worker_simulations[cell]
+    accuracy_cache.open(simulation.cache_path)
+    outcomes = [simulation.team_outcomes(team_type, sample) for sample in samples]
+    accuracy_cache.flush()
+    return outcomes
+
+
+def run_simulations(simulations: list["Simulation"]) -> None:
+    """Runs the simulations on one persistent process pool. The tasks of all
+    simulations are interleaved (expert teams first, then round robin over the
+    simulations) and idle workers take the next task from the shared queue. The
+    results are consumed as they are completed and written to disk in batches by
+    each simulation."""
+    tasks_per_simulation = [
+        [(cell, *task) for task in simulation.get_tasks()]
+        for cell, simulation in enumerate(simulations)
+    ]
+    tasks = [
+        task
+        for simulation_tasks in tasks_per_simulation
+        for task in simulation_tasks
+        if task[1] == "expert"
+    ]
+    tasks += [
+        task
+        for round_tasks in it.zip_longest(*tasks_per_simulation)
+        for task in round_tasks
+        if task is not None and task[1] != "expert"
+    ]
+    n_tasks_remaining = [len(cell_tasks) for cell_tasks in tasks_per_simulation]
+    for cell, simulation in enumerate(simulations):
+        if n_tasks_remaining[cell] == 0:
+            simulation.finalize()
+
+    with Pool(initializer=_init_worker, initargs=(simulations,)) as pool:
+        futures = {pool.submit(_simulate_chunk, task): task[0] for task in tasks}
+        for future in tqdm(
+            as_completed(futures),
+            total=len(futures),
+            desc="Calculating/estimating accuracies",
+        ):
+            cell = futures[future]
+            n_tasks_remaining[cell] -= 1
+            simulations[cell].checkpoint(future.result())
+            if n_tasks_remaining[cell] == 0:
+                simulations[cell].finalize()
 
 
 class Simulation:
@@ -27,6 +107,12 @@ class Simulation:
         team_size: int = 9,
         n_samples: int = 10**3,
         estimate_sample_size: int | None = None,
+        target_precision: float | None = None,
+        chunk_size: int = 50,
+        checkpoint_size: int = 500,
+        resume: bool = False,
+        store_path: str | None = "data/store",
+        cache_path: str | None = "data/accuracy_cache.sqlite",
     ):
         time_str = time.strftime("%Y%m%d_%H%M%S")
         self.filename_csv = filename_csv
@@ -43,117 +129,218 @@ class Simulation:
         self.team_size = team_size
         self.n_samples = n_samples
         self.estimate_sample_size = estimate_sample_size
+        self.target_precision = target_precision
+        self.chunk_size = chunk_size
+        self.checkpoint_size = checkpoint_size
+        self.resume = resume
+        # Exactly computed accuracies are shared across runs in this database
+        self.cache_path = cache_path
+        self.rows_pending: list[tuple] = []
+        # The results are checkpointed in a .partial.csv file while running, the
+        # completed results are moved to the results store (if any) as partition with
+        # the name of the csv file, or else to the csv file
+        self.store = None if store_path is None else ResultsStore(store_path)
+        name = os.path.splitext(self.filename_csv)[0]  # type: ignore
+        self.filename_checkpoint = f"{name}.partial.csv"
+        self.partition = os.path.basename(name)
+        if not resume and (
+            os.path.exists(self.filename_csv)  # type: ignore
+            or os.path.exists(self.filename_checkpoint)
+            or self.partition in self.stored_partitions()
+        ):
+            raise FileExistsError(
+                f"{self.filename_csv} already exists, pass resume=True to complete it."
+            )
 
     def run(self):
-        # Run simulations in parallel for opinion-based and bounded dynamics
-        with Pool() as pool:
-            params, total = self.get_params()
-            results_df = pd.DataFrame(
-                tqdm(
-                    pool.map(self.team_simulate, params),
-                    total=total,
-                    desc="Calculating/estimating accuracy opinion and bounded",
-                )
-            )
+        # Run simulations in parallel for the three dynamics. The workers receive the
+        # simulation once and then simulate chunks of samples.
+        run_simulations([self])
 
-        # Run simulations in parallel for evidence-based dynamics
-        with Pool() as pool:
-            team_simulate_evidence = partial(self.team_simulate, evidence=True)
-            total = len(self.team_types)
-            results_evidence = pd.DataFrame(
-                tqdm(
-                    pool.map(team_simulate_evidence, self.team_types),
-                    total=total,
-                    desc="Calculating accuracy evidence",
-                )
-            )
+    def checkpoint(self, rows: list[tuple]) -> None:
+        """Buffers rows and appends them to the checkpoint file once checkpoint_size
+        rows are pending. The rows are appended in place and synced to disk, an
+        incomplete last line (after a crash during a write) is removed before the file
+        is read or appended to."""
+        self.rows_pending += rows
+        if len(self.rows_pending) >= self.checkpoint_size:
+            self.write_pending_rows()
 
-        # Update accuracies evidence in results_df
-        for team_type in self.team_types:
-            team_accuracy_evidence = results_evidence[
-                results_evidence["team_type"] == team_type
-            ]["accuracy_evidence"].mean()
+    def write_pending_rows(self) -> None:
+        exists = os.path.exists(self.filename_checkpoint)
+        if exists:
+            self.repair_checkpoint()
+        results_df = self.results_df(self.rows_pending)
+        with open(self.filename_checkpoint, "a") as file:
+            results_df.to_csv(file, header=not exists, index=False)
+            file.flush()
+            os.fsync(file.fileno())
+        self.rows_pending = []
 
-            results_df.loc[
-                results_df["team_type"] == team_type, "accuracy_evidence"
-            ] = team_accuracy_evidence
+    def repair_checkpoint(self, block_size: int = 2**16) -> None:
+        """Truncates the checkpoint file after its last complete line."""
+        with open(self.filename_checkpoint, "rb+") as file:
+            end = file.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(position - block_size, 0)
+                file.seek(start)
+                block = file.read(position - start)
+                newline = block.rfind(b"\n")
+                if newline >= 0:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                file.truncate(position)
 
-        # Save results to CSV
-        results_df.to_csv(self.filename_csv)
+    def stored_partitions(self) -> list[str]:
+        return [] if self.store is None else self.store.partitions()
 
-    def get_params(self):
-        params = []
-        total: int = 0
+    def finalize(self) -> None:
+        """Writes the pending rows and sorts all results (including those completed
+        by an earlier run) by team type and sample. The results are then moved from
+        the checkpoint file to the results store (if any) or else the csv file."""
+        checkpoint_exists = os.path.exists(self.filename_checkpoint)
+        if not checkpoint_exists and not self.rows_pending:
+            if self.completed_results() is not None:
+                return
+        if self.rows_pending or not checkpoint_exists:
+            self.write_pending_rows()
+        results_df = self.read_results()
+        team_type_order = {
+            team_type: order for order, team_type in enumerate(self.team_types)
+        }
+        results_df["order"] = results_df["team_type"].map(team_type_order)
+        results_df = results_df.sort_values(["order", "sample"], kind="stable")
+        results_df = results_df.drop(columns="order").reset_index(drop=True)
+        if self.store is not None:
+            self.store.write(self.partition, results_df)
+        else:
+            filename_tmp = f"{self.filename_csv}.tmp"
+            results_df.to_csv(filename_tmp, index=False)
+            os.replace(filename_tmp, self.filename_csv)  # type: ignore
+        os.remove(self.filename_checkpoint)
+
+    def completed_results(self) -> pd.DataFrame | None:
+        """Returns the results finalized by an earlier run, if any."""
+        if self.partition in self.stored_partitions():
+            return self.store.read(self.partition)  # type: ignore
+        if os.path.exists(self.filename_csv):  # type: ignore
+            results_df = pd.read_csv(self.filename_csv)  # type: ignore
+            return results_df.drop(columns="Unnamed: 0", errors="ignore")
+        return None
+
+    def read_results(self) -> pd.DataFrame | None:
+        """Returns the finalized and checkpointed results, if any."""
+        results = [self.completed_results()]
+        if os.path.exists(self.filename_checkpoint):
+            self.repair_checkpoint()
+            results.append(pd.read_csv(self.filename_checkpoint))
+        results = [results_df for results_df in results if results_df is not None]
+        if not results:
+            return None
+        return pd.concat(results, ignore_index=True)
+
+    def completed_samples(self) -> dict[str, set]:
+        """Returns the sample indices per team type that are finalized or
+        checkpointed when resuming."""
+        results_df = self.read_results() if self.resume else None
+        if results_df is None:
+            return {}
+        if "sample" not in results_df.columns:
+            raise ValueError(f"{self.filename_csv} has no sample column to resume.")
+        return {
+            team_type: set(samples)
+            for team_type, samples in results_df.groupby("team_type")["sample"]
+        }
+
+    def get_tasks(self) -> list[tuple[str, tuple]]:
+        """Returns the tasks for the workers, a task consists of a team type and a
+        chunk of sample indices. When resuming, completed samples are skipped."""
+        completed_samples = self.completed_samples()
+        samples_per_team_type = {}
         if "expert" in self.team_types:
-            params = it.chain(params, ["expert"])
-            total += 1
+            samples_per_team_type["expert"] = range(1)
         for team_type in self.team_types:
             if "diverse" in team_type:
-                params = it.chain(params, it.repeat(team_type, self.n_samples))
-                total += self.n_samples
-        return params, total
+                samples_per_team_type[team_type] = range(self.n_samples)
+
+        tasks = []
+        for team_type, samples in samples_per_team_type.items():
+            completed = completed_samples.get(team_type, set())
+            samples_remaining = [
+                sample for sample in samples if sample not in completed
+            ]
+            tasks += [
+                (team_type, tuple(samples_remaining[start : start + self.chunk_size]))
+                for start in range(0, len(samples_remaining), self.chunk_size)
+            ]
+        return tasks
+
+    def parameters(self) -> dict:
+        heuristic_str = str(self.heuristic_size)  # type: ignore
+        if isinstance(self.heuristic_size, list):
+            heuristic_str = str(heuristic_str)[1:-1].replace(", ", "-")  # type: ignore
+        return {
+            "team_size": self.team_size,
+            "n_sources": self.n_sources,
+            "heuristic_size": heuristic_str,
+            "reliability_mean": self.reliability_distribution[1],
+            "reliability_range": self.reliability_distribution[2],
+            "n_samples": self.n_samples,
+        }
+
+    def results_df(self, rows: list[tuple]) -> pd.DataFrame:
+        results_df = pd.DataFrame(rows, columns=OUTCOME_COLUMNS)
+        for position, (column, value) in enumerate(self.parameters().items()):
+            results_df.insert(position, column, value)
+        return results_df
 
-    def team_simulate(self, team_type: str, evidence: bool = False):
+    def generate_team(self, team_type: str) -> Team:
         team_params = {
-            "sources": copy.deepcopy(self.sources),
+            "sources": self.sources,
             "heuristic_size": self.heuristic_size,
             "team_size": self.team_size,
         }
         if team_type == "expert":
-            team = generate_expert_team(**team_params)
-            accuracy_opinion, precision_opinion = team.accuracy_opinion()
-            accuracy_bounded, precision_bounded = team.accuracy_bounded()
+            return generate_expert_team(**team_params)
         elif team_type == "diverse":
-            team = generate_diverse_team(**team_params)
-            accuracy_opinion, precision_opinion = team.accuracy_opinion(
-                estimate_sample_size=self.estimate_sample_size
-            )
-            accuracy_bounded, precision_bounded = team.accuracy_bounded(
-                estimate_sample_size=self.estimate_sample_size
-            )
+            return generate_diverse_team(**team_params)
         elif team_type == "random":
-            team = generate_random_team(**team_params)
-            accuracy_opinion, precision_opinion = team.accuracy_opinion(
-                estimate_sample_size=self.estimate_sample_size
-            )
-            accuracy_bounded, precision_bounded = team.accuracy_bounded(
-                estimate_sample_size=self.estimate_sample_size
-            )
+            return generate_random_team(**team_params)
         elif "qualified_diverse" in team_type:
             qualified_percentile = float(team_type.split("_")[-1])
-            team = generate_qualified_diverse_team(
+            return generate_qualified_diverse_team(
                 **team_params, qualifying_percentile=qualified_percentile
             )
-            accuracy_opinion, precision_opinion = team.accuracy_opinion(
-                estimate_sample_size=self.estimate_sample_size
-            )
-            accuracy_bounded, precision_bounded = team.accuracy_bounded(
-                estimate_sample_size=self.estimate_sample_size
-            )
-        else:
-            raise ValueError(f"Unknown team type: {team_type}")
+        raise ValueError(f"Unknown team type: {team_type}")
 
-        heuristic_str = str(self.heuristic_size)  # type: ignore
-        if isinstance(self.heuristic_size, list):
-            heuristic_str = str(heuristic_str)[1:-1].replace(", ", "-")  # type: ignore
+    def team_outcomes(self, team_type: str, sample: int = 0) -> tuple:
+        """Returns the outcomes of a generated team in the order of OUTCOME_COLUMNS."""
+        team = self.generate_team(team_type)
+        if team_type == "expert":
+            accuracies = team.accuracies()
+        else:
+            accuracies = team.accuracies(
+                estimate_sample_size=self.estimate_sample_size,
+                target_precision=self.target_precision,
+            )
+        return (
+            team_type,
+            sample,
+            accuracies["accuracy_opinion"],
+            accuracies["precision_opinion"],
+            team.sample_sizes["opinion"],
+            accuracies["accuracy_evidence"],
+            accuracies["accuracy_bounded"],
+            team.diversity(),
+            team.average(),
+        )
 
-        results_dict = {
-            "team_size": self.team_size,
-            "n_sources": self.n_sources,
-            "heuristic_size": heuristic_str,
-            "reliability_mean": self.reliability_distribution[1],
-            "reliability_range": self.reliability_distribution[2],
-            "n_samples": self.n_samples,
-            "team_type": team_type,
-            "accuracy_opinion": accuracy_opinion,
-            "precision_opinion": precision_opinion,
-            "accuracy_evidence": team.accuracy_evidence() if evidence else None,
-            "accuracy_bounded": accuracy_bounded,
-            "precision_bouded": precision_bounded,
-            "diversity": team.diversity(),
-            "average": team.average(),
-        }
-        return results_dict
+    def team_simulate(self, team_type: str) -> dict:
+        outcomes = self.team_outcomes(team_type)
+        return {**self.parameters(), **dict(zip(OUTCOME_COLUMNS, outcomes))}
 
 
 if __name__ == "__main__":
@@ -0,0 +1,112 @@
+import itertools as it
+import multiprocessing
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+import utils.accuracy_cache
+from models.agent import Agent
+from models.sources import Sources
+from models.team import Team
+from utils.accuracy_cache import AccuracyCache, accuracy_cache
+from utils.basic_functions import calculate_team_competences
+
+KEYS = [((3, 5), "a"), ((3, 6), "a"), ((3, 5), "b")]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replaces the time of the cache by a counter, so that uses are ordered."""
+    monkeypatch.setattr(
+        utils.accuracy_cache, "time", SimpleNamespace(time=it.count().__next__)
+    )
+
+
+def test_get_many_counts_one_lookup():
+    cache = AccuracyCache()
+    assert cache.get_many(KEYS[0], ["opinion", "evidence"]) is None
+    cache.put(KEYS[0], "opinion", 0.6)
+    assert cache.get_many(KEYS[0], ["opinion", "evidence"]) is None
+    cache.put(KEYS[0], "evidence", 0.7)
+    assert cache.get_many(KEYS[0], ["opinion", "evidence"]) == [0.6, 0.7]
+    assert cache.info()["hits"] == 1 and cache.info()["misses"] == 2
+
+
+def test_memory_lru():
+    cache = AccuracyCache(maxsize=2)
+    cache.put(KEYS[0], "opinion", 0.1)
+    cache.put(KEYS[1], "opinion", 0.2)
+    cache.get(KEYS[0], "opinion")
+    cache.put(KEYS[2], "opinion", 0.3)
+    assert cache.get(KEYS[1], "opinion") is None
+    assert cache.get(KEYS[0], "opinion") == 0.1 and len(cache) == 2
+
+
+def test_disk(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    cache = AccuracyCache(path=path, maxsize_disk=2)
+    for value, key in enumerate(KEYS[:2]):
+        cache.put(key, "opinion", value)
+        cache.flush()
+    # A memory hit counts as a use on disk, so the least recently used is KEYS[1]
+    assert cache.get(KEYS[0], "opinion") == 0
+    cache.put(KEYS[2], "opinion", 2)
+    cache.put(KEYS[2], "opinion", 2)  # Written twice, counted once
+    cache.close()
+
+    cache = AccuracyCache(path=path, maxsize_disk=2)
+    assert cache.get(KEYS[1], "opinion") is None
+    assert cache.get(KEYS[0], "opinion") == 0
+    assert cache.get(KEYS[2], "opinion") == 2
+    assert cache.info()["hits"] == 2 and cache.hits_disk == 2
+    (n_rows,) = cache.connection().execute("SELECT n_rows FROM size").fetchone()
+    assert n_rows == 2
+    cache.close()
+
+
+def connect(path):
+    AccuracyCache(path=path).connection()
+
+
+def test_size_concurrent_connections(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    with multiprocessing.Pool(4) as pool:
+        pool.map(connect, [path] * 8)
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT id, n_rows FROM size").fetchall() == [(0, 0)]
+
+
+def test_size_earlier_table(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = AccuracyCache(path=path)
+    cache.put(KEYS[0], "opinion", 0.5)
+    cache.close()
+    # The size table had no key before and could hold several rows
+    with sqlite3.connect(path) as connection:
+        connection.execute("DROP TABLE size")
+        connection.execute("CREATE TABLE size (n_rows INTEGER)")
+        connection.execute("INSERT INTO size VALUES (0), (0)")
+    cache = AccuracyCache(path=path)
+    rows = cache.connection().execute("SELECT id, n_rows FROM size").fetchall()
+    assert rows == [(0, 1)]
+    cache.close()
+
+
+def test_team_accuracies():
+    sources = Sources(7, ("equi", 0.6, 0.2))
+    heuristics = [(0, 1, 2), (2, 3, 4), (4, 5, 6)]
+    team = Team([Agent(i, h, sources) for i, h in enumerate(heuristics)], sources)
+    accuracy_cache.clear()
+    accuracies = team.accuracies()
+    expected = calculate_team_competences(sources.reliabilities, team.membership)
+    assert [
+        accuracies[f"accuracy_{method}"]
+        for method in ["opinion", "evidence", "bounded"]
+    ] == pytest.approx(expected)
+    # A team with the same heuristics in another order is a single cache hit
+    team_reordered = Team(
+        [Agent(i, h, sources) for i, h in enumerate(heuristics[::-1])], sources
+    )
+    assert team_reordered.accuracies() == accuracies
+    assert accuracy_cache.info()["hits"] == 1 and accuracy_cache.info()["misses"] == 1
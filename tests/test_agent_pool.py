@@ -0,0 +1,35 @@
+import itertools as it
+
+import numpy as np
+import pytest
+
+from models.agent_pool import AgentPool, get_agent_pool
+from models.sources import Sources
+from utils.basic_functions import calculate_competence
+
+
+def test_agent_pool():
+    sources = Sources(7, ("equi", 0.6, 0.2))
+    pool = AgentPool(sources.reliabilities, [2, 3])
+    heuristics = list(it.combinations(range(7), 2)) + list(it.combinations(range(7), 3))
+    agents = pool.agents(range(len(pool)), sources)
+    assert [tuple(agent.heuristic) for agent in agents] == heuristics
+    np.testing.assert_allclose(
+        pool.scores,
+        [calculate_competence(sources.reliabilities[list(h)]) for h in heuristics],
+    )
+    assert [agent.score for agent in agents] == pytest.approx(pool.scores)
+    ranking = sorted(range(len(pool)), key=lambda id: pool.scores[id], reverse=True)
+    assert pool.top(5).tolist() == ranking[:5]
+
+
+def test_agent_pool_too_many_sources():
+    with pytest.raises(ValueError):
+        AgentPool(np.full(65, 0.6), 1)
+
+
+def test_get_agent_pool():
+    pool = get_agent_pool(Sources(7, ("equi", 0.6, 0.2)), 3)
+    assert get_agent_pool(Sources(7, ("equi", 0.6, 0.2)), [3]) is pool
+    assert get_agent_pool(Sources(7, ("equi", 0.6, 0.2)), [2, 3]) is not pool
+    assert get_agent_pool(Sources(7, ("equi", 0.65, 0.2)), 3) is not pool
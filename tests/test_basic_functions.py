@@ -0,0 +1,237 @@
+import itertools as it
+
+import numpy as np
+import pytest
+
+from utils.basic_functions import (
+    calculate_competence,
+    calculate_competence_opinion,
+    calculate_competence_opinion_dp,
+    calculate_competence_with_duplicates,
+    calculate_competences,
+    calculate_diversity,
+    calculate_diversity_masks,
+    calculate_team_competences,
+    estimate_accuracy,
+    estimate_competence_opinion,
+    heuristic_to_mask,
+    mask_to_heuristic,
+    masks_to_membership,
+    poisson_binomial_distribution,
+    sample_valences,
+    weighted_vote_distribution,
+)
+
+RELIABILITIES = np.array([0.5, 0.55, 0.6, 0.65, 0.7, 0.45, 0.8])
+
+
+MEMBERSHIPS = [
+    np.array([[1, 1, 1, 0, 0, 0, 0], [0, 0, 1, 1, 1, 0, 0], [0, 0, 0, 0, 1, 1, 1]]),
+    np.array([[1, 1, 0, 0, 0, 0, 0], [0, 1, 1, 0, 0, 0, 0], [1, 0, 0, 1, 0, 0, 1]]),
+    # Duplicate heuristics and an even team size
+    np.array(
+        [
+            [1, 1, 1, 0, 0, 0, 0],
+            [1, 1, 1, 0, 0, 0, 0],
+            [0, 1, 0, 1, 1, 0, 1],
+            [0, 0, 1, 0, 1, 1, 0],
+        ]
+    ),
+]
+
+
+def valence_patterns(reliabilities):
+    """Yields every valence pattern of the sources with its probability."""
+    for pattern in it.product([0, 1], repeat=len(reliabilities)):
+        pattern = np.array(pattern)
+        yield pattern, np.prod(np.where(pattern, reliabilities, 1 - reliabilities))
+
+
+def credit(votes_positive, total_votes):
+    """1 for a positive majority, 1/2 for a tie and 0 otherwise."""
+    return (2 * votes_positive > total_votes) + (2 * votes_positive == total_votes) / 2
+
+
+def brute_force_competence(reliabilities, weights):
+    return sum(
+        probability * credit(pattern @ weights, weights.sum())
+        for pattern, probability in valence_patterns(reliabilities)
+    )
+
+
+def brute_force_opinion(reliabilities, membership):
+    """Each member votes for its majority (ties broken by a fair coin) and the team
+    follows the majority of the votes (ties count for half)."""
+    sizes = membership.sum(axis=1)
+    accuracy = 0.0
+    for pattern, probability in valence_patterns(reliabilities):
+        counts = membership @ pattern
+        probabilities_for = np.where(2 * counts > sizes, 1.0, 0.0)
+        probabilities_for[2 * counts == sizes] = 0.5
+        for votes in it.product([0, 1], repeat=len(membership)):
+            votes = np.array(votes)
+            probability_votes = np.prod(
+                np.where(votes, probabilities_for, 1 - probabilities_for)
+            )
+            accuracy += (
+                probability * probability_votes * credit(votes.sum(), len(votes))
+            )
+    return accuracy
+
+
+def test_poisson_binomial_distribution():
+    expected = np.zeros(len(RELIABILITIES) + 1)
+    for pattern, probability in valence_patterns(RELIABILITIES):
+        expected[pattern.sum()] += probability
+    np.testing.assert_allclose(poisson_binomial_distribution(RELIABILITIES), expected)
+
+
+@pytest.mark.parametrize("n_sources", [1, 2, 5, 7])
+def test_calculate_competence(n_sources):
+    reliabilities = RELIABILITIES[:n_sources]
+    assert calculate_competence(reliabilities) == pytest.approx(
+        brute_force_competence(reliabilities, np.ones(n_sources, dtype=int))
+    )
+
+
+def test_calculate_competence_without_sources():
+    assert calculate_competence([]) == 0
+
+
+def test_calculate_competences():
+    reliabilities = np.array([RELIABILITIES[:4], RELIABILITIES[3:], RELIABILITIES[1:5]])
+    np.testing.assert_allclose(
+        calculate_competences(reliabilities),
+        [calculate_competence(row) for row in reliabilities],
+    )
+
+
+@pytest.mark.parametrize("weights", [[1, 2, 1, 3, 1, 1, 2], [0.5, 1, 1.5, 1, 2, 1, 1]])
+def test_weighted_vote_distribution(weights):
+    weights = np.array(weights)
+    expected: dict = {}
+    for pattern, probability in valence_patterns(RELIABILITIES):
+        weight = pattern @ weights
+        expected[weight] = expected.get(weight, 0) + probability
+    distribution = weighted_vote_distribution(RELIABILITIES, weights)
+    assert distribution.keys() == expected.keys()
+    for weight, probability in expected.items():
+        assert distribution[weight] == pytest.approx(probability)
+
+
+def test_calculate_competence_with_duplicates():
+    weights = np.array([1, 2, 1, 3, 1, 1, 2])
+    accuracy, precision = calculate_competence_with_duplicates(RELIABILITIES, weights)
+    assert accuracy == pytest.approx(brute_force_competence(RELIABILITIES, weights))
+    assert precision is None
+
+
+@pytest.mark.parametrize("membership", MEMBERSHIPS)
+@pytest.mark.parametrize("chunk_bits", [2, 16])
+def test_calculate_competence_opinion(membership, chunk_bits):
+    assert calculate_competence_opinion(
+        RELIABILITIES, membership.astype(bool), chunk_bits
+    ) == pytest.approx(brute_force_opinion(RELIABILITIES, membership))
+
+
+@pytest.mark.parametrize("membership", MEMBERSHIPS)
+@pytest.mark.parametrize("chunk_bits", [2, 16])
+def test_calculate_team_competences(membership, chunk_bits):
+    accuracy_opinion, accuracy_evidence, accuracy_bounded = calculate_team_competences(
+        RELIABILITIES, membership.astype(bool), chunk_bits
+    )
+    assert accuracy_opinion == pytest.approx(
+        brute_force_opinion(RELIABILITIES, membership)
+    )
+    assert accuracy_evidence == pytest.approx(
+        brute_force_competence(RELIABILITIES, membership.any(axis=0).astype(int))
+    )
+    assert accuracy_bounded == pytest.approx(
+        brute_force_competence(RELIABILITIES, membership.sum(axis=0))
+    )
+
+
+@pytest.mark.parametrize("membership", MEMBERSHIPS)
+def test_calculate_competence_opinion_dp(membership):
+    assert calculate_competence_opinion_dp(
+        RELIABILITIES, membership.astype(bool)
+    ) == pytest.approx(brute_force_opinion(RELIABILITIES, membership))
+
+
+def test_sample_valences():
+    chunks = list(sample_valences(RELIABILITIES, 10**5, chunk_size=30000))
+    assert [len(chunk) for chunk in chunks] == [30000, 30000, 30000, 10000]
+    np.testing.assert_allclose(
+        np.concatenate(chunks).mean(axis=0), RELIABILITIES, atol=0.01
+    )
+
+
+def test_estimate_competence_opinion():
+    np.random.seed(0)
+    membership = MEMBERSHIPS[2].astype(bool)
+    accuracy, precision, sample_size = estimate_competence_opinion(
+        RELIABILITIES, membership, 10**5
+    )
+    exact = calculate_competence_opinion(RELIABILITIES, membership)
+    assert abs(accuracy - exact) < precision and sample_size == 10**5
+    # With a target precision sampling stops early
+    accuracy, precision, sample_size = estimate_competence_opinion(
+        RELIABILITIES, membership, 10**6, target_precision=0.02
+    )
+    assert precision <= 0.02 and sample_size < 10**6
+    assert abs(accuracy - exact) < precision
+
+
+def test_estimate_competence_with_duplicates():
+    np.random.seed(0)
+    weights = np.array([1, 2, 1, 3, 1, 1, 2])
+    accuracy, precision = calculate_competence_with_duplicates(
+        RELIABILITIES, weights, 10**5
+    )
+    exact, _ = calculate_competence_with_duplicates(RELIABILITIES, weights)
+    assert abs(accuracy - exact) < precision
+
+
+def test_estimate_accuracy():
+    accuracy, precision, sample_size = estimate_accuracy(lambda n: n // 2, 1000)
+    assert (accuracy, sample_size) == (0.5, 1000)
+    assert precision > 0
+    _, _, sample_size = estimate_accuracy(lambda n: n, 10**6, 0.1, 100)
+    assert sample_size < 10**6
+
+
+@pytest.mark.parametrize("sample_sizes", [(0, 1000), (1000, 0), (-1, 1000)])
+def test_estimate_accuracy_rejects_non_positive_sample_sizes(sample_sizes):
+    estimate_sample_size, initial_sample_size = sample_sizes
+    with pytest.raises(ValueError):
+        estimate_accuracy(
+            lambda n: n, estimate_sample_size, initial_sample_size=initial_sample_size
+        )
+
+
+def test_heuristic_masks():
+    heuristics = [(0,), (0, 2, 5), (1, 3, 4, 63)]
+    masks = [heuristic_to_mask(heuristic) for heuristic in heuristics]
+    assert masks[1] == 0b100101
+    assert [mask_to_heuristic(mask) for mask in masks] == heuristics
+    np.testing.assert_array_equal(
+        masks_to_membership(np.array(masks[:2]), 6),
+        [[1, 0, 0, 0, 0, 0], [1, 0, 1, 0, 0, 1]],
+    )
+
+
+def test_heuristic_masks_too_many_sources():
+    assert heuristic_to_mask((0, 63)) == np.uint64(2**63 + 1)
+    with pytest.raises(ValueError):
+        heuristic_to_mask((0, 64))
+    with pytest.raises(ValueError):
+        masks_to_membership(np.zeros(1, dtype=np.uint64), 65)
+
+
+def test_calculate_diversity_masks():
+    heuristics = list(it.combinations(range(5), 2)) + list(it.combinations(range(5), 3))
+    masks = np.array([heuristic_to_mask(heuristic) for heuristic in heuristics])
+    np.testing.assert_allclose(
+        calculate_diversity_masks(masks[:, None], masks[None, :]),
+        [[calculate_diversity(h1, h2) for h2 in heuristics] for h1 in heuristics],
+    )
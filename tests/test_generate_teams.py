@@ -0,0 +1,59 @@
+import itertools as it
+import random as rd
+
+import numpy as np
+import pytest
+
+from models.agent import Agent
+from models.agent_pool import get_agent_pool
+from models.generate_teams import generate_expert_team, greedy_diverse_group
+from models.sources import Sources
+from utils.basic_functions import calculate_diversity
+
+
+def test_generate_expert_team():
+    sources = Sources(7, ("equi", 0.6, 0.2))
+    team = generate_expert_team(sources, 3, 4)
+    # The selection of the original implementation: all agents sorted by score
+    agents = [Agent(i, h, sources) for i, h in enumerate(it.combinations(range(7), 3))]
+    agents.sort(key=lambda agent: agent.score, reverse=True)
+    assert sorted(agent.score for agent in team.members) == pytest.approx(
+        sorted(agent.score for agent in agents[:4])
+    )
+
+
+def greedy_diverse_group_reference(heuristics, team_size):
+    """The greedy selection of the original generate_diverse_team, on the indices of
+    the heuristics."""
+    diversity_dict = {i: 0 for i in range(len(heuristics))}
+    diverse_group = []
+    for _ in range(team_size):
+        max_diversity = max(diversity_dict.values())
+        new_member = rd.choice(
+            [i for i, diversity in diversity_dict.items() if diversity == max_diversity]
+        )
+        diverse_group.append(new_member)
+        diversity_dict.pop(new_member)
+        for i in diversity_dict:
+            diversity_dict[i] += calculate_diversity(
+                heuristics[i], heuristics[new_member]
+            )
+    return diverse_group
+
+
+@pytest.mark.parametrize("qualifying_percentile", [None, 80])
+def test_greedy_diverse_group(qualifying_percentile):
+    sources = Sources(7, ("equi", 0.6, 0.2))
+    pool = get_agent_pool(sources, [2, 3])
+    candidates = pool.ids
+    if qualifying_percentile is not None:
+        candidates = np.flatnonzero(
+            pool.scores >= pool.percentile(qualifying_percentile)
+        )
+    heuristics = [agent.heuristic for agent in pool.agents(candidates, sources)]
+    for seed in range(5):
+        rd.seed(seed)
+        expected = greedy_diverse_group_reference(heuristics, 5)
+        rd.seed(seed)
+        selected = greedy_diverse_group(pool, candidates, 5)
+        assert selected == [int(candidates[i]) for i in expected]
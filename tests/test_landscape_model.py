@@ -0,0 +1,203 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from models.landscape_model import (
+    Agent,
+    EnsembleSimulation,
+    Landscape,
+    Team,
+    all_perm,
+    calc_score,
+    find_experts,
+    generate_heights,
+    heuristic_scores,
+    run,
+)
+
+
+def generate_heights_loop(points, seg_lens):
+    """The loop of the original landscape generation for given points and segment
+    lengths."""
+    heights = []
+    for j, seg_len in enumerate(seg_lens):
+        a, b = points[j], points[j + 1]
+        step = np.round((b - a) / seg_len, 2)
+        for i in range(1, seg_len + 1):
+            heights.append(min(a + step * i, 100))
+    return heights
+
+
+def tournament_reference(team, start):
+    """The tournament of the original implementation, which recomputes the ingroup
+    histories and the aggregate from the search results of all members."""
+    length = team.landscape.length
+    maps = {a: np.zeros(length, dtype=int) for a in team.members}
+    on, maxi, loc = True, 0, start
+    while on:
+        for m in team.members:
+            in_hist = np.sum([maps[n] for n in team.trust[m]], axis=0)
+            maps[m] = m.search(loc, maps[m], in_hist)
+        num = np.sum(list(maps.values()), axis=0)
+        denom = np.sum([m > 0 for m in maps.values()], axis=0)
+        aggregate = num / (denom + (denom == 0))
+        on = False
+        if aggregate.max() > maxi:
+            on, loc, maxi = True, aggregate.argmax(), aggregate.max()
+    return team.landscape.heights[np.argmax(aggregate)]
+
+
+def diverse_team(landscape, trust_level):
+    random.seed(0)
+    heuristics = random.sample(all_perm, 9)
+    agents = [Agent(i, h, landscape) for i, h in enumerate(heuristics)]
+    return Team(agents, landscape, trust_level)
+
+
+@pytest.mark.parametrize("smoothness", [1, 3, 8])
+def test_generate_heights(smoothness):
+    length, n_landscapes = 100, 5
+    landscapes = generate_heights(
+        smoothness, length, n_landscapes, np.random.default_rng(0)
+    )
+    n_segments = round(length / smoothness) - 1
+    rng = np.random.default_rng(0)
+    points = rng.integers(1, 101, size=(n_landscapes, n_segments + 1))
+    seg_lens = rng.integers(1, 2 * smoothness, size=(n_landscapes, n_segments))
+    for heights, points_r, seg_lens_r in zip(landscapes, points, seg_lens):
+        np.testing.assert_allclose(heights, generate_heights_loop(points_r, seg_lens_r))
+
+
+def test_landscape_batch():
+    landscapes = Landscape.batch(3, 5, 60, np.random.default_rng(0))
+    for landscape, heights in zip(
+        landscapes, generate_heights(3, 60, 5, np.random.default_rng(0))
+    ):
+        assert landscape.length == len(heights) > 0
+        np.testing.assert_array_equal(landscape.heights, heights)
+
+
+@pytest.fixture
+def landscape():
+    return Landscape(4, 80, rng=np.random.default_rng(1))
+
+
+def test_search_all_starts(landscape):
+    agent = Agent(0, all_perm[7], landscape)
+    findings = agent.search_all_starts()
+    for start in range(landscape.length):
+        own_hist = np.zeros(landscape.length, dtype=int)
+        in_hist = np.zeros(landscape.length, dtype=int)
+        agent.search(start, own_hist, in_hist)
+        np.testing.assert_array_equal(findings[start], own_hist)
+
+
+def test_calc_score(landscape):
+    agent = Agent(0, all_perm[7], landscape)
+    calc_score(agent, landscape)
+    scores = []
+    for start in range(landscape.length):
+        results = agent.search(
+            start,
+            np.zeros(landscape.length, dtype=int),
+            np.zeros(landscape.length, dtype=int),
+        )
+        scores.append(landscape.heights[np.argmax(results)])
+    assert agent.score == pytest.approx(np.mean(scores))
+
+
+def test_empty_landscape():
+    landscape = Landscape(8)
+    assert landscape.length == 0
+    agent = Agent(0, all_perm[7], landscape)
+    calc_score(agent, landscape)
+    assert np.isnan(agent.score)
+    random.seed(0)
+    data = run(8, 0.5, 8, landscape)
+    assert np.isnan(data[1]) and np.isnan(data[2])
+
+
+def test_heuristic_scores(landscape):
+    heuristics = all_perm[:40]
+    expected = []
+    for i, h in enumerate(heuristics):
+        agent = Agent(i, h, landscape)
+        calc_score(agent, landscape)
+        expected.append(agent.score)
+    scores = heuristic_scores(landscape, heuristics)
+    np.testing.assert_allclose(scores, expected)
+    assert heuristic_scores(landscape, heuristics) is scores
+    landscape_copy = Landscape(landscape.s, heights=landscape.heights)
+    np.testing.assert_allclose(
+        heuristic_scores(landscape_copy, heuristics, n_jobs=2), expected
+    )
+
+
+def test_find_experts(landscape):
+    random.seed(0)
+    team = find_experts(landscape, 1, all_perm[:40])
+    scores = np.sort(heuristic_scores(landscape, all_perm[:40]))[::-1]
+    assert sorted(
+        (agent.score for agent in team.members), reverse=True
+    ) == pytest.approx(scores[: len(team.members)])
+
+
+@pytest.mark.parametrize("trust_level", [0, 0.5, 1])
+def test_tournament(landscape, trust_level):
+    team = diverse_team(landscape, trust_level)
+    for start in range(landscape.length):
+        assert team.tournament(start) == tournament_reference(team, start)
+
+
+@pytest.mark.parametrize("trust_level", [0, 0.5, 1])
+def test_tournament_all_starts(landscape, trust_level):
+    team = diverse_team(landscape, trust_level)
+    results = team.tournament_all_starts(batch_size=7)
+    np.testing.assert_array_equal(
+        results, [team.tournament(start) for start in range(landscape.length)]
+    )
+
+
+def test_ensemble_simulation_shards(tmp_path):
+    filename_csv = str(tmp_path / "ensemble.csv")
+    simulation = EnsembleSimulation([2, 4], [0, 8], [0.5], n_landscapes=3, length=40)
+    shards = [simulation.cells(filename_csv, (index, 2)) for index in range(2)]
+    assert sorted(shards[0] + shards[1]) == [0, 1, 2, 3]
+    simulation.run(filename_csv, shard=(0, 2), n_jobs=2)
+    results_df = pd.read_csv(filename_csv)
+    assert len(results_df) == 2 and (results_df["n_landscapes"] == 3).all()
+    assert simulation.cells(filename_csv) == shards[1]
+
+
+def test_ensemble_simulation_seeded(tmp_path):
+    simulation = EnsembleSimulation([2, 4], [8], [0.5], n_landscapes=3, length=40)
+    simulation.run(str(tmp_path / "ensemble_1.csv"), n_jobs=1)
+    simulation.run(str(tmp_path / "ensemble_2.csv"), n_jobs=2)
+    results_1 = pd.read_csv(tmp_path / "ensemble_1.csv").sort_values("smoothness")
+    results_2 = pd.read_csv(tmp_path / "ensemble_2.csv").sort_values("smoothness")
+    assert len(results_1) == 2
+    pd.testing.assert_frame_equal(
+        results_1.reset_index(drop=True), results_2.reset_index(drop=True)
+    )
+
+
+def test_ensemble_simulation_empty_landscapes(tmp_path):
+    filename_csv = str(tmp_path / "ensemble.csv")
+    simulation = EnsembleSimulation([2, 8], [0], [1], n_landscapes=2)
+    simulation.run(filename_csv, n_jobs=2)
+    results_df = pd.read_csv(filename_csv).set_index("smoothness")
+    assert sorted(results_df.index) == [2, 8]
+    assert results_df.loc[2, ["diverse", "expert", "diverse_better"]].notna().all()
+    assert results_df.loc[8, ["diverse", "expert", "diverse_better"]].isna().all()
+
+
+def test_ensemble_simulation_failed_task(tmp_path):
+    filename_csv = str(tmp_path / "ensemble.csv")
+    # Smoothness 0 fails in generate_heights, which must not stop smoothness 2
+    simulation = EnsembleSimulation([0, 2], [0], [1], n_landscapes=2)
+    with pytest.warns(UserWarning, match="smoothness 0 failed"):
+        simulation.run(filename_csv, n_jobs=2)
+    assert list(pd.read_csv(filename_csv)["smoothness"]) == [2]
+    assert simulation.cells(filename_csv) == [0]
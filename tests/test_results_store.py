@@ -0,0 +1,120 @@
+import os
+
+import pandas as pd
+import pytest
+
+from utils.results_store import ResultsStore
+
+
+def results(accuracy_shift=0.0):
+    return pd.DataFrame(
+        {
+            "team_size": 9,
+            "n_sources": 13,
+            "heuristic_size": 7,
+            "reliability_mean": 0.55,
+            "reliability_range": 0.2,
+            "n_samples": 3,
+            "team_type": ["expert", "diverse", "random"],
+            "accuracy_opinion": [0.7, 0.65, 0.6],
+            "precision_opinion": float("nan"),
+            "accuracy_evidence": [0.68, 0.64, 0.66],
+            "diversity": [0.2, 0.5, 0.4],
+        }
+    ).assign(accuracy_opinion=lambda df: df["accuracy_opinion"] + accuracy_shift)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ResultsStore(str(tmp_path / "store"))
+
+
+def test_write_read(store):
+    store.write("simulation_20250101_000000", results())
+    pd.testing.assert_frame_equal(
+        store.read("simulation_20250101_000000"), results(), check_dtype=False
+    )
+    parameters = store.parameters("simulation_20250101_000000")
+    assert parameters["team_size"] == 9 and parameters["n_rows"] == 3
+    assert parameters["team_types"] == ["diverse", "expert", "random"]
+    assert list(store.read("simulation_20250101_000000", ["diversity"]).columns) == [
+        "team_size",
+        "n_sources",
+        "heuristic_size",
+        "reliability_mean",
+        "reliability_range",
+        "n_samples",
+        "diversity",
+    ]
+
+
+def test_select(store):
+    store.write("simulation_20250101_000000", results())
+    store.write("simulation_20250102_000000", results().assign(team_size=8))
+    assert store.partitions("20250102") == ["simulation_20250102_000000"]
+    assert len(store.partitions()) == 2
+    assert store.select(team_size=[8, 9], n_sources=13) == store.partitions()
+    assert store.select(team_size=8) == ["simulation_20250102_000000"]
+
+
+def test_partition_names(store):
+    store.write("results", results())
+    store.write("simulation_20250101_000000", results())
+    assert store.partitions() == ["results", "simulation_20250101_000000"]
+    assert store.partitions("20250101") == ["simulation_20250101_000000"]
+
+
+def test_manifest(store):
+    store.write("simulation_20250101_000000", results())
+    store.write("simulation_20250102_000000", results())
+    manifest = store.manifest()
+    os.remove(store.filename_manifest)
+    rebuilt = store.manifest()
+    assert rebuilt.keys() == manifest.keys()
+    assert all(rebuilt[name]["hash"] == manifest[name]["hash"] for name in manifest)
+    assert all(
+        rebuilt[name]["parameters"] == manifest[name]["parameters"] for name in manifest
+    )
+
+
+def test_read_cached_is_invalidated(store):
+    store.write("simulation_20250101_000000", results())
+    hash_before = store.manifest()["simulation_20250101_000000"]["hash"]
+    assert store.read_cached("simulation_20250101_000000") is store.read_cached(
+        "simulation_20250101_000000"
+    )
+    store.write("simulation_20250101_000000", results(0.1))
+    assert store.manifest()["simulation_20250101_000000"]["hash"] != hash_before
+    pd.testing.assert_frame_equal(
+        store.read_cached("simulation_20250101_000000"),
+        results(0.1),
+        check_dtype=False,
+    )
+
+
+def test_import_csv_directory(store, tmp_path):
+    results().to_csv(tmp_path / "simulation_20250101_000000.csv")
+    results().to_csv(tmp_path / "landscape.csv", index=False)
+    assert store.import_csv_directory(str(tmp_path)) == ["simulation_20250101_000000"]
+    assert store.partitions() == ["simulation_20250101_000000"]
+    pd.testing.assert_frame_equal(
+        store.read("simulation_20250101_000000"), results(), check_dtype=False
+    )
+    # Files that are already imported are skipped
+    assert store.import_csv_directory(str(tmp_path)) == []
+
+
+def test_import_changed_csv(store, tmp_path):
+    results().to_csv(tmp_path / "simulation_20250101_000000.csv", index=False)
+    store.import_csv_directory(str(tmp_path))
+    results(0.1).to_csv(tmp_path / "simulation_20250101_000000.csv", index=False)
+    os.utime(tmp_path / "simulation_20250101_000000.csv", ns=(0, 0))
+    assert store.import_csv_directory(str(tmp_path)) == ["simulation_20250101_000000"]
+    pd.testing.assert_frame_equal(
+        store.read("simulation_20250101_000000"), results(0.1), check_dtype=False
+    )
+
+
+def test_import_skips_checkpoints(store, tmp_path):
+    results().to_csv(tmp_path / "simulation_20250101_000000.partial.csv", index=False)
+    assert store.import_csv_directory(str(tmp_path)) == []
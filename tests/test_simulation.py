@@ -0,0 +1,123 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from models.generate_teams import generate_expert_team
+from simulation import Simulation, _init_worker, run_simulations
+
+PARAMETERS = {
+    "n_sources": 7,
+    "heuristic_size": 3,
+    "team_size": 3,
+    "n_samples": 5,
+    "chunk_size": 2,
+    "store_path": None,
+    "cache_path": None,
+}
+
+
+def make_simulation(tmp_path, name="simulation_test", **parameters):
+    return Simulation(
+        filename_csv=str(tmp_path / f"{name}.csv"), **{**PARAMETERS, **parameters}
+    )
+
+
+def read_results(simulation):
+    return simulation.read_results()
+
+
+def test_get_tasks(tmp_path):
+    tasks = make_simulation(tmp_path).get_tasks()
+    assert [(team_type, list(samples)) for team_type, samples in tasks] == [
+        ("expert", [0]),
+        ("diverse", [0, 1]),
+        ("diverse", [2, 3]),
+        ("diverse", [4]),
+    ]
+
+
+def test_init_worker_reseeds_numpy():
+    # A forked worker starts with the random state of the parent
+    np.random.seed(0)
+    parent = np.random.random(4)
+    np.random.seed(0)
+    _init_worker([])
+    assert not np.array_equal(np.random.random(4), parent)
+
+
+def test_run(tmp_path):
+    simulation = make_simulation(tmp_path)
+    simulation.run()
+    results_df = read_results(simulation)
+    assert results_df["team_type"].tolist() == ["expert"] + ["diverse"] * 5
+    expert = generate_expert_team(simulation.sources, 3, 3)
+    assert results_df["accuracy_opinion"].iloc[0] == pytest.approx(
+        expert.accuracy_opinion()[0]
+    )
+    accuracy_columns = ["accuracy_opinion", "accuracy_evidence", "accuracy_bounded"]
+    assert results_df[accuracy_columns].notna().all().all()
+
+
+def test_run_simulations(tmp_path):
+    simulations = [
+        make_simulation(tmp_path, "simulation_7", n_samples=3),
+        make_simulation(tmp_path, "simulation_9", n_sources=9, n_samples=4),
+    ]
+    run_simulations(simulations)
+    for simulation, n_samples in zip(simulations, [3, 4]):
+        results_df = read_results(simulation)
+        assert results_df["team_type"].tolist() == ["expert"] + ["diverse"] * n_samples
+        assert (results_df["n_sources"] == simulation.n_sources).all()
+
+
+def test_file_exists(tmp_path):
+    make_simulation(tmp_path).run()
+    with pytest.raises(FileExistsError):
+        make_simulation(tmp_path)
+
+
+def test_resume(tmp_path):
+    simulation = make_simulation(tmp_path, checkpoint_size=1)
+    # A run that was interrupted after the expert team and two diverse teams
+    simulation.checkpoint([simulation.team_outcomes("expert", 0)])
+    simulation.checkpoint([simulation.team_outcomes("diverse", s) for s in (1, 3)])
+    resumed = make_simulation(tmp_path, resume=True)
+    tasks = resumed.get_tasks()
+    assert [(team_type, list(samples)) for team_type, samples in tasks] == [
+        ("diverse", [0, 2]),
+        ("diverse", [4]),
+    ]
+    resumed.run()
+    results_df = resumed.read_results()
+    assert results_df["team_type"].tolist() == ["expert"] + ["diverse"] * 5
+    assert results_df["sample"].tolist() == [0, 0, 1, 2, 3, 4]
+
+
+def test_run_with_store(tmp_path):
+    store_path = str(tmp_path / "store")
+    simulation = make_simulation(tmp_path, store_path=store_path)
+    simulation.run()
+    assert not os.path.exists(simulation.filename_csv)
+    results_df = simulation.store.read(simulation.partition)
+    assert results_df["sample"].tolist() == [0, 0, 1, 2, 3, 4]
+    with pytest.raises(FileExistsError):
+        make_simulation(tmp_path, store_path=store_path)
+
+
+def test_repair_checkpoint(tmp_path):
+    simulation = make_simulation(tmp_path, checkpoint_size=1)
+    simulation.checkpoint([simulation.team_outcomes("expert", 0)])
+    simulation.checkpoint([simulation.team_outcomes("diverse", 0)])
+    # A crash while appending leaves an incomplete last line
+    with open(simulation.filename_checkpoint, "a") as file:
+        file.write("3,7,3,0.6")
+    simulation.repair_checkpoint(block_size=8)
+    checkpoint_df = pd.read_csv(simulation.filename_checkpoint)
+    assert checkpoint_df["team_type"].tolist() == ["expert", "diverse"]
+    assert "Unnamed: 0" not in checkpoint_df.columns
+    resumed = make_simulation(tmp_path, resume=True, checkpoint_size=1)
+    resumed.run()
+    assert not os.path.exists(resumed.filename_checkpoint)
+    assert resumed.read_results()["sample"].tolist() == [0, 0, 1, 2, 3, 4]
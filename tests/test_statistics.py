@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from data_analysis.statistics import (
+    bootstrap_median_ci,
+    exact_median_ci,
+    wilcoxon_results,
+)
+
+
+@pytest.mark.parametrize("n", [51, 50])
+def test_bootstrap_median_ci(n):
+    data = np.random.default_rng(0).normal(size=n)
+    # The percentile bootstrap by resampling the data
+    resamples = data[np.random.default_rng(1).integers(0, n, size=(20000, n))]
+    expected = np.percentile(np.median(resamples, axis=1), [2.5, 97.5])
+    ci = bootstrap_median_ci(data, rng=np.random.default_rng(2))
+    np.testing.assert_allclose(ci, expected, atol=0.1)
+
+
+def test_exact_median_ci():
+    data = np.random.default_rng(0).permutation(100).astype(float)
+    # 40 is the 2.5% quantile of the binomial(100, 1/2) distribution
+    assert exact_median_ci(data) == (39, 60)
+    assert exact_median_ci(data[:5]) == (-np.inf, np.inf)
+
+
+def test_wilcoxon_results_ci_method():
+    rng = np.random.default_rng(0)
+    data, data_paired = rng.normal(0.5, 1, 200), rng.normal(0, 1, 200)
+    for ci_method in ["bootstrap", "exact"]:
+        results = wilcoxon_results(data, data_paired, ci_method=ci_method)
+        assert results["ci_low"] < results["difference"] < results["ci_high"]
+    with pytest.raises(ValueError):
+        wilcoxon_results(data, data_paired, ci_method="normal")
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from models.agent import Agent
+from models.sources import Sources
+from models.team import Team
+from utils.basic_functions import calculate_competence, calculate_diversity
+
+HEURISTICS = [(0, 1, 2), (2, 3, 4), (4, 5, 6), (0, 3, 6)]
+
+
+def make_team(heuristics, sources):
+    return Team([Agent(i, h, sources) for i, h in enumerate(heuristics)], sources)
+
+
+def test_team_metrics():
+    sources = Sources(7, ("equi", 0.6, 0.2))
+    team = make_team(HEURISTICS, sources)
+    assert team.diversity() == pytest.approx(
+        np.mean(
+            [
+                calculate_diversity(h1, h2)
+                for h1 in HEURISTICS
+                for h2 in HEURISTICS
+                if h1 != h2
+            ]
+        )
+    )
+    assert team.average() == pytest.approx(
+        np.mean(
+            [calculate_competence(sources.reliabilities[list(h)]) for h in HEURISTICS]
+        )
+    )
+    np.testing.assert_array_equal(team.source_counts(), [2, 1, 2, 2, 2, 1, 2])
+    # Setting the members resets the memoized metrics
+    team.members = team.members[:2]
+    assert team.diversity() == pytest.approx(
+        calculate_diversity(HEURISTICS[0], HEURISTICS[1])
+    )
+    np.testing.assert_array_equal(team.source_counts(), [1, 1, 2, 1, 1, 0, 0])
+
+
+def test_team_accuracies():
+    sources = Sources(7, ("equi", 0.6, 0.2))
+    team = make_team(HEURISTICS, sources)
+    accuracies = team.accuracies()
+    assert accuracies["accuracy_opinion"] == pytest.approx(team.accuracy_opinion()[0])
+    assert accuracies["accuracy_evidence"] == pytest.approx(team.accuracy_evidence())
+    assert accuracies["accuracy_bounded"] == pytest.approx(team.accuracy_bounded()[0])
+    assert accuracies["precision_opinion"] is None
@@ -0,0 +1,232 @@
+import atexit
+import hashlib
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+import utils.config as cfg
+
+
+def reliabilities_fingerprint(reliabilities: np.ndarray) -> str:
+    """Returns a hash of the reliabilities, which identifies the sources of a team."""
+    reliabilities = np.ascontiguousarray(reliabilities, dtype=np.float64)
+    return hashlib.blake2b(reliabilities.tobytes(), digest_size=16).hexdigest()
+
+
+class AccuracyCache:
+    """
+    A class representing an LRU cache of exactly computed accuracies of teams, keyed
+    by the canonical team (the sorted heuristics as bitmasks and the fingerprint of
+    the reliabilities) and the method (the dynamics). If a path is set, the cache is
+    backed by an SQLite database that persists across runs and is shared by
+    processes: new accuracies are written in batches (see flush) and the least
+    recently used accuracies are evicted beyond maxsize_disk.
+
+    Attributes
+    ----------
+        maxsize (int):
+            The maximal number of accuracies cached in memory.
+        path (str | None):
+            The SQLite database backing the cache, if any.
+        maxsize_disk (int):
+            The maximal number of accuracies in the database.
+        hits (int):
+            The number of lookups that found an accuracy (in memory or on disk).
+        hits_disk (int):
+            The number of lookups that found an accuracy on disk.
+        misses (int):
+            The number of lookups that did not find an accuracy.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = cfg.accuracy_cache_size,
+        path: str | None = None,
+        maxsize_disk: int = cfg.accuracy_cache_size_disk,
+    ):
+        self.maxsize = maxsize
+        self.path = path
+        self.maxsize_disk = maxsize_disk
+        self.hits = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, float] = OrderedDict()
+        self._pending: list[tuple] = []
+        self._used: set[tuple] = set()
+        self._connection: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def open(self, path: str | None) -> None:
+        """Sets the database backing the cache (None for memory only)."""
+        if path == self.path:
+            return
+        self.close()
+        self.path = path
+
+    def close(self) -> None:
+        self.flush()
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+
+    def connection(self) -> sqlite3.Connection:
+        """Returns the connection of this process to the database. Connections are
+        not shared with forked processes, and concurrent writers wait for each other
+        (write-ahead logging with a busy timeout)."""
+        if self._connection is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)  # type: ignore
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=60)  # type: ignore
+            self._pid = os.getpid()
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS accuracies (team TEXT, reliabilities "
+                "TEXT, method TEXT, accuracy REAL, last_used REAL, "
+                "PRIMARY KEY (team, reliabilities, method))"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS accuracies_last_used "
+                "ON accuracies (last_used)"
+            )
+            # The number of rows is kept in a single-row table, so that it is not
+            # counted on every flush. It is set up in one write transaction, so that
+            # processes connecting at the same time do not both initialize it
+            self._connection.execute("BEGIN IMMEDIATE")
+            columns = [
+                row[1] for row in self._connection.execute("PRAGMA table_info(size)")
+            ]
+            if columns and "id" not in columns:  # Earlier table without a key
+                self._connection.execute("DROP TABLE size")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS size "
+                "(id INTEGER PRIMARY KEY CHECK (id = 0), n_rows INTEGER)"
+            )
+            self._connection.execute(
+                "INSERT OR IGNORE INTO size SELECT 0, count(*) FROM accuracies"
+            )
+            self._connection.commit()
+        return self._connection
+
+    @staticmethod
+    def _row_key(key: tuple, method: str) -> tuple[str, str, str]:
+        masks, fingerprint = key
+        return ",".join(map(str, masks)), fingerprint, method
+
+    def _lookup(self, key: tuple, method: str) -> tuple[float | None, bool]:
+        """Returns the cached accuracy (or None) and whether it was read from disk,
+        without counting the lookup."""
+        value = self._entries.get((key, method))
+        if value is not None:
+            self._entries.move_to_end((key, method))
+            if self.path is not None:
+                self._used.add(self._row_key(key, method))
+            return value, False
+        if self.path is not None:
+            row_key = self._row_key(key, method)
+            row = (
+                self.connection()
+                .execute(
+                    "SELECT accuracy FROM accuracies "
+                    "WHERE team = ? AND reliabilities = ? AND method = ?",
+                    row_key,
+                )
+                .fetchone()
+            )
+            if row is not None:
+                self._used.add(row_key)
+                self._put_memory(key, method, row[0])
+                return row[0], True
+        return None, False
+
+    def get(self, key: tuple, method: str) -> float | None:
+        values = self.get_many(key, [method])
+        return None if values is None else values[0]
+
+    def get_many(self, key: tuple, methods: list[str]) -> list[float] | None:
+        """Returns the cached accuracies for all methods, or None if one is missing.
+        This counts as a single lookup."""
+        lookups = [self._lookup(key, method) for method in methods]
+        if any(value is None for value, _ in lookups):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.hits_disk += any(from_disk for _, from_disk in lookups)
+        return [value for value, _ in lookups]
+
+    def _put_memory(self, key: tuple, method: str, value: float) -> None:
+        self._entries[(key, method)] = value
+        self._entries.move_to_end((key, method))
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def put(self, key: tuple, method: str, value: float) -> None:
+        self._put_memory(key, method, value)
+        if self.path is not None:
+            self._pending.append((*self._row_key(key, method), value))
+            if len(self._pending) >= cfg.accuracy_cache_flush_size:
+                self.flush()
+
+    def flush(self) -> None:
+        """Writes the new accuracies and the times the cached accuracies were used (in
+        memory or on disk) to the database and evicts the least recently used
+        accuracies once the database holds more than maxsize_disk accuracies."""
+        if self.path is None or not (self._pending or self._used):
+            return
+        now = time.time()
+        connection = self.connection()
+        with connection:
+            n_inserted = connection.executemany(
+                "INSERT OR IGNORE INTO accuracies VALUES (?, ?, ?, ?, ?)",
+                [(*row, now) for row in self._pending],
+            ).rowcount
+            connection.executemany(
+                "UPDATE accuracies SET last_used = ? "
+                "WHERE team = ? AND reliabilities = ? AND method = ?",
+                [(now, *row_key) for row_key in self._used],
+            )
+            connection.execute(
+                "UPDATE size SET n_rows = n_rows + ? WHERE id = 0",
+                (max(n_inserted, 0),),
+            )
+            (n_rows,) = connection.execute(
+                "SELECT n_rows FROM size WHERE id = 0"
+            ).fetchone()
+            if n_rows > self.maxsize_disk:
+                n_deleted = connection.execute(
+                    "DELETE FROM accuracies WHERE rowid IN (SELECT rowid FROM "
+                    "accuracies ORDER BY last_used LIMIT ?)",
+                    (n_rows - self.maxsize_disk,),
+                ).rowcount
+                connection.execute(
+                    "UPDATE size SET n_rows = n_rows - ? WHERE id = 0", (n_deleted,)
+                )
+        self._pending = []
+        self._used = set()
+
+    def clear(self) -> None:
+        """Clears the cache in memory and the counters (not the database)."""
+        self._entries.clear()
+        self.hits = 0
+        self.hits_disk = 0
+        self.misses = 0
+
+    def info(self) -> dict:
+        return {
+            "hits": self.hits,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+        }
+
+
+# The cache of the process, shared by all teams (and team types) in a run
+accuracy_cache = AccuracyCache()
+atexit.register(accuracy_cache.close)
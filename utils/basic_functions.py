@@ -1,5 +1,8 @@
 import itertools as it
 import random as rd
+from functools import partial
+from math import comb
+from typing import Callable
 
 import numpy as np
 from statsmodels.stats.proportion import proportion_confint
@@ -47,6 +50,17 @@ def calculate_accuracy_precision_proportion(
         number_of_success = list_of_items.count(cfg.vote_for_positive)
     if isinstance(list_of_items, np.ndarray):
         number_of_success = np.count_nonzero(list_of_items == cfg.vote_for_positive)
+    return calculate_accuracy_precision_count(number_of_success, number_of_items, alpha)
+
+
+def calculate_accuracy_precision_count(
+    number_of_success: int, number_of_items: int, alpha: float = 0.05
+) -> tuple:
+    """Basic function to calculate the accuracy and precision from the number of
+    successes among a number of items.
+    :returns tuple
+        accuracy, precision
+    """
     accuracy = number_of_success / number_of_items
     confidence_interval_low, confidence_interval_high = proportion_confint(
         number_of_success, number_of_items, alpha=alpha
@@ -55,6 +69,26 @@ def calculate_accuracy_precision_proportion(
     return accuracy, precision
 
 
+def sample_valences(
+    reliabilities: np.ndarray, sample_size: int, chunk_size: int | None = None
+):
+    """Generates sample_size valence patterns of the sources as boolean arrays (True
+    for positive) of at most chunk_size rows each, so that memory stays bounded."""
+    if chunk_size is None:
+        chunk_size = cfg.sample_chunk_size
+    for start in range(0, sample_size, chunk_size):
+        size = min(chunk_size, sample_size - start)
+        yield np.random.random((size, len(reliabilities))) < reliabilities
+
+
+def count_majority_success(votes_for: np.ndarray, votes_against: np.ndarray) -> int:
+    """Counts the samples in which the positive option wins the majority vote, where
+    ties are broken uniformly at random."""
+    ties = votes_for == votes_against
+    wins = (votes_for > votes_against) | (ties & (np.random.random(len(ties)) < 0.5))
+    return int(np.count_nonzero(wins))
+
+
 def calculate_diversity(list1: list, list2: list) -> float:
     novel_items1 = [item for item in list1 if item not in list2]
     novelty1 = len(novel_items1) / len(list1)
@@ -64,39 +98,433 @@ def calculate_diversity(list1: list, list2: list) -> float:
     return diversity
 
 
+def poisson_binomial_distribution(
+    reliabilities: list[float] | np.ndarray,
+) -> np.ndarray:
+    """Returns the distribution of the number of positive sources, i.e. the entry at
+    index k is the probability that exactly k sources are positive. Computed with the
+    O(n^2) dynamic program over the sources instead of enumerating the powerset."""
+    distribution = np.ones(1)
+    for reliability in np.asarray(reliabilities, dtype=float):
+        distribution = np.append(distribution * (1 - reliability), 0) + np.append(
+            0, distribution * reliability
+        )
+    return distribution
+
+
+# Number of sources that fit into the bitmask of a heuristic
+MASK_BITS = 64
+
+
+def check_mask_sources(n_sources: int) -> None:
+    """Raises a ValueError if heuristics over n_sources sources do not fit into
+    bitmasks."""
+    if n_sources > MASK_BITS:
+        raise ValueError(
+            f"Heuristics as bitmasks support at most {MASK_BITS} sources, not "
+            f"{n_sources}."
+        )
+
+
+def heuristic_to_mask(heuristic) -> np.uint64:
+    """Returns the bitmask of a heuristic, i.e. bit s is set iff the heuristic contains
+    source s (which requires at most MASK_BITS sources)."""
+    heuristic = np.asarray(heuristic, dtype=np.int64)
+    check_mask_sources(int(heuristic.max(initial=-1)) + 1)
+    return np.bitwise_or.reduce(
+        np.left_shift(np.uint64(1), heuristic.astype(np.uint64)),
+        initial=np.uint64(0),
+    )
+
+
+def mask_to_heuristic(mask: np.uint64) -> tuple:
+    return tuple(source for source in range(MASK_BITS) if (int(mask) >> source) & 1)
+
+
+def masks_to_membership(masks: np.ndarray, n_sources: int) -> np.ndarray:
+    """Returns the boolean matrix of heuristics (given as bitmasks) by sources."""
+    check_mask_sources(n_sources)
+    bits = np.left_shift(np.uint64(1), np.arange(n_sources, dtype=np.uint64))
+    return (np.asarray(masks, dtype=np.uint64)[:, None] & bits) != 0
+
+
+def calculate_diversity_masks(
+    masks1: np.ndarray | np.uint64, masks2: np.ndarray | np.uint64
+) -> np.ndarray:
+    """Vectorized calculate_diversity for heuristics given as bitmasks, which
+    broadcasts like a NumPy operation."""
+    masks1 = np.asarray(masks1, dtype=np.uint64)
+    masks2 = np.asarray(masks2, dtype=np.uint64)
+    overlap = np.bitwise_count(masks1 & masks2)
+    sizes1 = np.bitwise_count(masks1)
+    sizes2 = np.bitwise_count(masks2)
+    return ((sizes1 - overlap) / sizes1 + (sizes2 - overlap) / sizes2) / 2
+
+
 def calculate_competence(reliabilities: list[float] | np.ndarray) -> float:
-    competence: float = 0
     number_of_sources = len(reliabilities)
-    sources = np.array(range(len(reliabilities)))
     if number_of_sources == 0:
         return 0
     threshold = number_of_sources / 2
 
-    for sources_positive in powerset(sources):
-        if len(sources_positive) >= threshold:
-            probabilities_list = [
-                reliabilities[source] for source in sources_positive
-            ] + [
-                1 - reliabilities[source]
-                for source in sources
-                if source not in sources_positive
-            ]
-            probability_subset: float = float(np.prod(probabilities_list))
-            if len(sources_positive) > threshold:
-                competence += probability_subset
-            elif len(sources_positive) == threshold:
-                competence += probability_subset / 2
-    return competence
+    distribution = poisson_binomial_distribution(reliabilities)
+    n_positive = np.arange(number_of_sources + 1)
+    competence = distribution[n_positive > threshold].sum()
+    competence += distribution[n_positive == threshold].sum() / 2
+    return float(competence)
+
+
+def weighted_vote_distribution(
+    reliabilities: list | np.ndarray, weights: list | np.ndarray
+) -> dict:
+    """Returns the distribution of the total weight of the positive sources as a
+    dictionary mapping each attainable total weight to its probability. For integer
+    weights this is a dynamic program over an array of length sum(weights) + 1, so it
+    costs O(n * total_weight) instead of 2^n."""
+    reliabilities = np.asarray(reliabilities, dtype=float)
+    weights = np.asarray(weights)
+    if np.all(np.mod(weights, 1) == 0):
+        distribution = np.ones(1)
+        for reliability, weight in zip(reliabilities, weights.astype(int)):
+            updated = np.zeros(len(distribution) + weight)
+            updated[: len(distribution)] += distribution * (1 - reliability)
+            updated[weight:] += distribution * reliability
+            distribution = updated
+        return {
+            int(weight): float(probability)
+            for weight, probability in enumerate(distribution)
+            if probability > 0
+        }
+
+    distribution_dict: dict = {0: 1.0}
+    for reliability, weight in zip(reliabilities, weights):
+        updated_dict: dict = {}
+        for weight_positive, probability in distribution_dict.items():
+            for weight_new, probability_new in (
+                (weight_positive, probability * (1 - reliability)),
+                (weight_positive + weight, probability * reliability),
+            ):
+                updated_dict[weight_new] = (
+                    updated_dict.get(weight_new, 0) + probability_new
+                )
+        distribution_dict = updated_dict
+    return distribution_dict
+
+
+def majority_credit_table(n_voters: int) -> np.ndarray:
+    """Returns the table whose entry [d, t] is the probability that a majority vote of
+    n_voters is won by the positive option (ties count for half) when d voters vote
+    positive and t voters break their own ties uniformly at random."""
+    table = np.zeros((n_voters + 1, n_voters + 1))
+    threshold = n_voters / 2
+    for n_positive in range(n_voters + 1):
+        for n_ties in range(n_voters - n_positive + 1):
+            for n_ties_positive in range(n_ties + 1):
+                probability = comb(n_ties, n_ties_positive) / 2**n_ties
+                votes_positive = n_positive + n_ties_positive
+                if votes_positive > threshold:
+                    table[n_positive, n_ties] += probability
+                elif votes_positive == threshold:
+                    table[n_positive, n_ties] += probability / 2
+    return table
+
+
+def majority_credit(votes_positive: np.ndarray, total_votes) -> np.ndarray:
+    """Returns 1 for a positive majority, 1/2 for a tie and 0 otherwise."""
+    return (2 * votes_positive > total_votes) + (2 * votes_positive == total_votes) / 2
+
+
+def calculate_team_competences(
+    reliabilities: list | np.ndarray,
+    membership: np.ndarray,
+    chunk_bits: int = 16,
+) -> tuple[float, float, float]:
+    """Exact accuracies of the opinion-based, evidence-based and boundedly rational
+    evidence-based dynamics in one traversal of the valence patterns. The rows of the
+    boolean matrix membership are the heuristics of the agents over the given sources.
+    Every valence pattern of the sources is an integer whose bits mark the positive
+    sources, and each agent's number of positive sources is the popcount of the pattern
+    masked by its heuristic. The patterns are processed in chunks of 2^chunk_bits.
+    :returns tuple
+        accuracy opinion, accuracy evidence, accuracy bounded
+    """
+    reliabilities = np.asarray(reliabilities, dtype=float)
+    membership = np.asarray(membership, dtype=bool)
+    n_sources = len(reliabilities)
+    n_members = len(membership)
+    heuristic_sizes = membership.sum(axis=1)
+    bits = np.left_shift(np.uint64(1), np.arange(n_sources, dtype=np.uint64))
+    masks = (membership * bits).sum(axis=1, dtype=np.uint64)
+    mask_evidence = np.bitwise_or.reduce(masks, initial=np.uint64(0))
+    n_sources_evidence = np.bitwise_count(mask_evidence)
+    credit_table = majority_credit_table(n_members)
+
+    # Probability of each pattern of the low bits, the high bits give a factor per chunk
+    chunk_bits = min(chunk_bits, n_sources)
+    probabilities_low = np.ones(1)
+    for reliability in reliabilities[:chunk_bits]:
+        probabilities_low = np.concatenate(
+            [probabilities_low * (1 - reliability), probabilities_low * reliability]
+        )
+    reliabilities_high = reliabilities[chunk_bits:]
+
+    accuracy_opinion, accuracy_evidence, accuracy_bounded = 0.0, 0.0, 0.0
+    patterns_low = np.arange(2**chunk_bits, dtype=np.uint64)
+    for pattern_high in range(2 ** (n_sources - chunk_bits)):
+        positives_high = (pattern_high >> np.arange(len(reliabilities_high))) & 1
+        probability_high = np.prod(
+            np.where(positives_high, reliabilities_high, 1 - reliabilities_high)
+        )
+        probabilities = probability_high * probabilities_low
+        patterns = patterns_low | np.uint64(pattern_high << chunk_bits)
+        counts_positive = np.bitwise_count(patterns[:, None] & masks[None, :])
+
+        votes_positive = (2 * counts_positive > heuristic_sizes).sum(axis=1)
+        votes_tied = (2 * counts_positive == heuristic_sizes).sum(axis=1)
+        accuracy_opinion += probabilities @ credit_table[votes_positive, votes_tied]
+
+        counts_evidence = np.bitwise_count(patterns & mask_evidence)
+        accuracy_evidence += probabilities @ majority_credit(
+            counts_evidence, n_sources_evidence
+        )
+
+        # Each source is weighted by the number of members that have access to it
+        weights_positive = counts_positive.sum(axis=1, dtype=int)
+        accuracy_bounded += probabilities @ majority_credit(
+            weights_positive, heuristic_sizes.sum()
+        )
+    return float(accuracy_opinion), float(accuracy_evidence), float(accuracy_bounded)
+
+
+def calculate_competence_opinion(
+    reliabilities: list | np.ndarray,
+    membership: np.ndarray,
+    chunk_bits: int = 16,
+) -> float:
+    """Exact accuracy of the opinion-based dynamics, see calculate_team_competences."""
+    return calculate_team_competences(reliabilities, membership, chunk_bits)[0]
+
+
+def count_success_opinion(
+    reliabilities: np.ndarray, membership: np.ndarray, sample_size: int
+) -> int:
+    """Counts the successes of the opinion-based dynamics among sample_size sampled
+    valence patterns. Each agent's number of positive sources is a matrix product of
+    the valences with its heuristic, and tied agents break their ties uniformly at
+    random."""
+    membership = np.asarray(membership, dtype=np.float32)
+    heuristic_sizes = membership.sum(axis=1)
+    number_of_success = 0
+    for valences in sample_valences(reliabilities, sample_size):
+        counts_positive = valences.astype(np.float32) @ membership.T
+        votes_for = 2 * counts_positive > heuristic_sizes
+        votes_tied = 2 * counts_positive == heuristic_sizes
+        votes_for |= votes_tied & (np.random.random(votes_tied.shape) < 0.5)
+        n_votes_for = votes_for.sum(axis=1)
+        number_of_success += count_majority_success(
+            n_votes_for, len(membership) - n_votes_for
+        )
+    return number_of_success
+
+
+def count_success_with_duplicates(
+    reliabilities: np.ndarray, weights: np.ndarray, sample_size: int
+) -> int:
+    """Counts the successes of the weighted majority of the sources among sample_size
+    sampled valence patterns."""
+    total_weight = weights.sum()
+    number_of_success = 0
+    for valences in sample_valences(reliabilities, sample_size):
+        weight_sources_positive = valences @ weights
+        number_of_success += count_majority_success(
+            weight_sources_positive, total_weight - weight_sources_positive
+        )
+    return number_of_success
+
+
+def estimate_accuracy(
+    count_success: Callable[[int], int],
+    estimate_sample_size: int,
+    target_precision: float | None = None,
+    initial_sample_size: int = 1000,
+) -> tuple[float, float, int]:
+    """Estimates an accuracy from count_success, which counts the successes among a
+    given number of samples. Without target_precision all estimate_sample_size samples
+    are used. Otherwise, samples are drawn in batches of growing size until the width
+    of the confidence interval is at most target_precision, and estimate_sample_size is
+    the maximal number of samples.
+    :returns tuple
+        accuracy, precision, number of samples used
+    """
+    if estimate_sample_size <= 0 or initial_sample_size <= 0:
+        raise ValueError("The sample sizes of an estimate must be positive.")
+    if target_precision is None:
+        initial_sample_size = estimate_sample_size
+    number_of_success = 0
+    sample_size = 0
+    batch_size = initial_sample_size
+    while sample_size < estimate_sample_size:
+        batch_size = min(batch_size, estimate_sample_size - sample_size)
+        number_of_success += count_success(batch_size)
+        sample_size += batch_size
+        accuracy, precision = calculate_accuracy_precision_count(
+            number_of_success, sample_size
+        )
+        if target_precision is not None and precision <= target_precision:
+            break
+        batch_size = sample_size
+    return accuracy, precision, sample_size
+
+
+def estimate_competence_opinion(
+    reliabilities: list | np.ndarray,
+    membership: np.ndarray,
+    estimate_sample_size: int,
+    target_precision: float | None = None,
+) -> tuple[float, float, int]:
+    """Estimates the accuracy of the opinion-based dynamics by sampling, see
+    estimate_accuracy for the meaning of target_precision.
+    :returns tuple
+        accuracy, precision, number of samples used
+    """
+    reliabilities = np.asarray(reliabilities, dtype=float)
+    return estimate_accuracy(
+        partial(count_success_opinion, reliabilities, membership),
+        estimate_sample_size,
+        target_precision,
+    )
+
+
+def estimate_competence_with_duplicates(
+    reliabilities: list | np.ndarray,
+    weights: list | np.ndarray,
+    estimate_sample_size: int,
+    target_precision: float | None = None,
+) -> tuple[float, float, int]:
+    """Estimates the accuracy of the weighted majority of the sources by sampling, see
+    estimate_accuracy for the meaning of target_precision.
+    :returns tuple
+        accuracy, precision, number of samples used
+    """
+    reliabilities = np.asarray(reliabilities, dtype=float)
+    return estimate_accuracy(
+        partial(count_success_with_duplicates, reliabilities, np.asarray(weights)),
+        estimate_sample_size,
+        target_precision,
+    )
+
+
+def calculate_competence_opinion_dp(
+    reliabilities: list | np.ndarray, membership: np.ndarray
+) -> float:
+    """Exact accuracy of the opinion-based dynamics for many sources. The sources are
+    processed one at a time and a state records, for each distinct heuristic that is
+    still undecided, its number of positive sources, together with the weight of the
+    agents that are decided positive, negative or tied. Equal states are merged in a
+    dictionary, heuristics are decided as soon as their majority is locked in and
+    states are dropped as soon as the team majority is locked in."""
+    reliabilities = np.asarray(reliabilities, dtype=float)
+    heuristics, weights = np.unique(
+        np.asarray(membership, dtype=bool), axis=0, return_counts=True
+    )
+    n_members = int(weights.sum())
+    n_groups = len(heuristics)
+    heuristic_sizes = heuristics.sum(axis=1)
+    credit_table = majority_credit_table(n_members)
+
+    # Order the sources such that heuristics are completed one after the other, which
+    # keeps the number of undecided heuristics (and thereby the states) small
+    order_groups = [0]
+    while len(order_groups) < n_groups:
+        sources_seen = heuristics[order_groups].any(axis=0)
+        overlaps = [
+            -1 if group in order_groups else (heuristics[group] & sources_seen).sum()
+            for group in range(n_groups)
+        ]
+        order_groups.append(int(np.argmax(overlaps)))
+    order_sources: list = []
+    for group in order_groups:
+        order_sources += [
+            source
+            for source in np.flatnonzero(heuristics[group])
+            if source not in order_sources
+        ]
+
+    decided = -1
+    remaining = heuristic_sizes.copy()
+    # state: (counts positive per heuristic, weight positive, weight negative, ties)
+    states: dict = {((0,) * n_groups, 0, 0, 0): 1.0}
+    accuracy = 0.0
+    for source in order_sources:
+        groups = np.flatnonzero(heuristics[:, source])
+        remaining[groups] -= 1
+        updated_states: dict = {}
+        for (counts, positive, negative, ties), probability in states.items():
+            for is_positive, probability_valence in (
+                (True, reliabilities[source]),
+                (False, 1 - reliabilities[source]),
+            ):
+                new_counts = list(counts)
+                new_positive, new_negative, new_ties = positive, negative, ties
+                for group in groups:
+                    if new_counts[group] == decided:
+                        continue
+                    count = new_counts[group] + is_positive
+                    if 2 * count > heuristic_sizes[group]:
+                        new_positive += weights[group]
+                        count = decided
+                    elif 2 * (count + remaining[group]) < heuristic_sizes[group]:
+                        new_negative += weights[group]
+                        count = decided
+                    elif remaining[group] == 0:
+                        new_ties += weights[group]
+                        count = decided
+                    new_counts[group] = count
+                new_probability = probability * probability_valence
+                if 2 * new_positive > n_members:
+                    accuracy += new_probability
+                elif 2 * new_negative > n_members:
+                    continue
+                else:
+                    key = (tuple(new_counts), new_positive, new_negative, new_ties)
+                    updated_states[key] = updated_states.get(key, 0) + new_probability
+        states = updated_states
+
+    for (_, positive, _, ties), probability in states.items():
+        accuracy += probability * credit_table[positive, ties]
+    return float(accuracy)
+
+
+def calculate_competences(reliabilities: np.ndarray) -> np.ndarray:
+    """Vectorized calculate_competence: returns the competence of every row of the
+    matrix of reliabilities, i.e. of every heuristic of the same size at once."""
+    reliabilities = np.atleast_2d(np.asarray(reliabilities, dtype=float))
+    n_heuristics, number_of_sources = reliabilities.shape
+    if number_of_sources == 0:
+        return np.zeros(n_heuristics)
+    threshold = number_of_sources / 2
+
+    distribution = np.zeros((n_heuristics, number_of_sources + 1))
+    distribution[:, 0] = 1
+    for source in range(number_of_sources):
+        reliability = reliabilities[:, source, None]
+        updated = distribution * (1 - reliability)
+        updated[:, 1:] += distribution[:, :-1] * reliability
+        distribution = updated
+    n_positive = np.arange(number_of_sources + 1)
+    competences = distribution[:, n_positive > threshold].sum(axis=1)
+    competences += distribution[:, n_positive == threshold].sum(axis=1) / 2
+    return competences
 
 
 def calculate_competence_with_duplicates(
     reliabilities: list | np.ndarray,
     weights: list | np.ndarray | None = None,
     estimate_sample_size: int | None = None,
+    target_precision: float | None = None,
 ) -> tuple[float, float | None]:
     competence: float = 0
     n_sources = len(reliabilities)
-    sources = np.array(range(len(reliabilities)))
     if n_sources == 0:
         return 0, None
     if weights is None:
@@ -108,40 +536,16 @@ def calculate_competence_with_duplicates(
 
     # 1. Estimate by sampling if estimate_sample_size is integer
     if isinstance(estimate_sample_size, int):
-        outcomes = np.array([], dtype=float)
-        for _ in range(estimate_sample_size):
-            randoms = np.random.random(n_sources)
-            weight_sources_positive = weights[randoms < reliabilities].sum()
-            if weight_sources_positive > threshold:
-                outcomes = np.append(outcomes, cfg.vote_for_positive)
-            elif weight_sources_positive < threshold:
-                outcomes = np.append(outcomes, cfg.vote_for_negative)
-            else:
-                outcomes = np.append(
-                    outcomes, rd.choice([cfg.vote_for_positive, cfg.vote_for_negative])
-                )
-        estimated_accuracy, precision = calculate_accuracy_precision_proportion(
-            outcomes
+        estimated_accuracy, precision, _ = estimate_competence_with_duplicates(
+            reliabilities, weights, estimate_sample_size, target_precision
         )
         return estimated_accuracy, precision
 
     # 2. Else calculate
-    for sources_positive in powerset(sources):
-        sources_positive = np.array(sources_positive)
-        weight_sources_positive = 0
-        if len(sources_positive) != 0:
-            weight_sources_positive = np.sum(weights[sources_positive])
-        if weight_sources_positive >= threshold:
-            probabilities_list = [
-                reliabilities[source] for source in sources_positive
-            ] + [
-                1 - reliabilities[source]
-                for source in sources
-                if source not in sources_positive
-            ]
-            probability_subset: float = float(np.prod(probabilities_list))
-            if weight_sources_positive > threshold:
-                competence += probability_subset
-            elif weight_sources_positive == threshold:
-                competence += probability_subset / 2
-    return competence, None
+    distribution = weighted_vote_distribution(reliabilities, weights)
+    for weight_sources_positive, probability in distribution.items():
+        if weight_sources_positive > threshold:
+            competence += probability
+        elif weight_sources_positive == threshold:
+            competence += probability / 2
+    return float(competence), None
@@ -1,2 +1,13 @@
 vote_for_positive: int = 1
 vote_for_negative: int = -1
+# Maximal number of relevant sources for which the opinion-based accuracy is computed
+# by enumerating all valence patterns (beyond it a dynamic program is used)
+max_sources_enumeration: int = 20
+# Number of valence patterns that are sampled at once when estimating accuracies
+sample_chunk_size: int = 2**14
+# Maximal number of exactly computed team accuracies that are cached per process
+accuracy_cache_size: int = 2**16
+# Maximal number of team accuracies in the persistent cache (on disk) and the number
+# of new accuracies that are written to it at once
+accuracy_cache_size_disk: int = 2**22
+accuracy_cache_flush_size: int = 256
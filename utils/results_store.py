@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import shutil
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Columns that are constant within a simulation and stored once per partition
+PARAMETER_COLUMNS = [
+    "team_size",
+    "n_sources",
+    "heuristic_size",
+    "reliability_mean",
+    "reliability_range",
+    "n_samples",
+]
+
+# Process-level cache of the manifests, reloaded when the file changes
+_manifests: dict[str, tuple[tuple[int, int], dict]] = {}
+
+
+def _parameter_value(value):
+    """Converts NumPy scalars to Python values and numeric strings (such as a single
+    heuristic size) to integers, as they are read from csv files."""
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    return value
+
+
+def _file_signature(filename: str) -> tuple[int, int]:
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _content_hash(path_partition: str) -> str:
+    """Returns the SHA-256 hash of the files of a partition."""
+    content_hash = hashlib.sha256()
+    for file in sorted(os.listdir(path_partition)):
+        content_hash.update(file.encode())
+        with open(os.path.join(path_partition, file), "rb") as f:
+            content_hash.update(f.read())
+    return content_hash.hexdigest()
+
+
+@lru_cache(maxsize=128)
+def _read_cached(
+    path: str, name: str, content_hash: str, columns: tuple[str, ...] | None
+) -> pd.DataFrame:
+    """Reads a partition once per process, the content hash invalidates the cache
+    when the partition is rewritten."""
+    return ResultsStore(path).read(name, None if columns is None else list(columns))
+
+
+class ResultsStore:
+    """
+    A class representing a columnar store of simulation results. Each simulation is a
+    partition, i.e. a folder containing a file parameters.json with the parameter
+    columns (stored once) and one .npy file per outcome column, which is loaded with
+    memory mapping. The file manifest.json maps each partition to its parameters, its
+    number of rows, its content hash and the csv file it was imported from (if any),
+    so that partitions can be selected without opening them.
+
+    Attributes
+    ----------
+        path (str):
+            The folder containing the partitions.
+    """
+
+    def __init__(self, path: str = "data/store"):
+        self.path = path
+        self.filename_manifest = os.path.join(path, "manifest.json")
+
+    def manifest(self) -> dict[str, dict]:
+        """Returns the manifest, which is only read again when the file has changed.
+        A missing manifest is rebuilt from the partitions."""
+        if not os.path.isfile(self.filename_manifest):
+            if not os.path.isdir(self.path):
+                return {}
+            self.rebuild_manifest()
+        signature = _file_signature(self.filename_manifest)
+        cached = _manifests.get(self.filename_manifest)
+        if cached is None or cached[0] != signature:
+            with open(self.filename_manifest) as file:
+                cached = (signature, json.load(file))
+            _manifests[self.filename_manifest] = cached
+        return cached[1]
+
+    def write_manifest(self, manifest: dict[str, dict]) -> None:
+        filename_tmp = f"{self.filename_manifest}.tmp"
+        with open(filename_tmp, "w") as file:
+            json.dump(manifest, file, indent=1, sort_keys=True)
+        os.replace(filename_tmp, self.filename_manifest)
+
+    def rebuild_manifest(self) -> None:
+        """Builds the manifest from the parameters.json files of the partitions."""
+        manifest = {}
+        for name in sorted(os.listdir(self.path)):
+            path_partition = os.path.join(self.path, name)
+            filename_parameters = os.path.join(path_partition, "parameters.json")
+            if name.endswith(".tmp") or not os.path.isfile(filename_parameters):
+                continue
+            with open(filename_parameters) as file:
+                manifest[name] = {
+                    "parameters": json.load(file),
+                    "hash": _content_hash(path_partition),
+                    "source": None,
+                }
+        self.write_manifest(manifest)
+
+    def update_manifest(self, name: str, entry: dict) -> None:
+        manifest = dict(self.manifest())
+        manifest[name] = entry
+        self.write_manifest(manifest)
+
+    def partitions(self, date: str = "") -> list[str]:
+        """Returns the names of the partitions, optionally only those whose name
+        contains the date string."""
+        return sorted(
+            name
+            for name in self.manifest()
+            if not date or ("_" in name and date in name.split("_")[1])
+        )
+
+    def parameters(self, name: str) -> dict:
+        return self.manifest()[name]["parameters"]
+
+    def write(
+        self, name: str, results_df: pd.DataFrame, source: dict | None = None
+    ) -> None:
+        """Writes the results as partition name. The partition is written to a
+        temporary folder that is renamed once complete."""
+        results_df = results_df.drop(columns="Unnamed: 0", errors="ignore")
+        parameters = {
+            column: _parameter_value(results_df[column].iloc[0])
+            for column in PARAMETER_COLUMNS
+            if column in results_df.columns and results_df[column].nunique() == 1
+        }
+        parameters["n_rows"] = len(results_df)
+        parameters["team_types"] = sorted(results_df["team_type"].unique().tolist())
+        parameters["columns"] = [
+            column for column in results_df.columns if column not in parameters
+        ]
+
+        path_partition = os.path.join(self.path, name)
+        path_tmp = f"{path_partition}.tmp"
+        shutil.rmtree(path_tmp, ignore_errors=True)
+        os.makedirs(path_tmp)
+        for column in results_df.columns:
+            if column in parameters:
+                continue
+            values = results_df[column]
+            if values.dtype == object or pd.api.types.is_string_dtype(values):
+                array = values.to_numpy(dtype=str)
+            elif pd.api.types.is_integer_dtype(values):
+                array = values.to_numpy(dtype=np.int64)
+            else:
+                array = values.to_numpy(dtype=np.float64, na_value=np.nan)
+            np.save(os.path.join(path_tmp, f"{column}.npy"), array)
+        with open(os.path.join(path_tmp, "parameters.json"), "w") as file:
+            json.dump(parameters, file)
+        content_hash = _content_hash(path_tmp)
+        shutil.rmtree(path_partition, ignore_errors=True)
+        os.replace(path_tmp, path_partition)
+        self.update_manifest(
+            name, {"parameters": parameters, "hash": content_hash, "source": source}
+        )
+
+    def read(self, name: str, columns: list[str] | None = None) -> pd.DataFrame:
+        """Reads partition name (optionally only some outcome columns) as a DataFrame
+        including the parameter columns."""
+        path_partition = os.path.join(self.path, name)
+        parameters = self.parameters(name)
+        if columns is None:
+            columns = parameters["columns"]
+        results_df = pd.DataFrame(
+            {
+                column: np.load(
+                    os.path.join(path_partition, f"{column}.npy"), mmap_mode="r"
+                )
+                for column in columns
+            }
+        )
+        for position, column in enumerate(PARAMETER_COLUMNS):
+            if column in parameters:
+                results_df.insert(position, column, parameters[column])
+        return results_df
+
+    def read_cached(self, name: str, columns: list[str] | None = None) -> pd.DataFrame:
+        """Reads partition name through the process-level cache, which is invalidated
+        when the manifest records a different content hash. The returned DataFrame
+        is shared and should not be modified in place."""
+        return _read_cached(
+            self.path,
+            name,
+            self.manifest()[name]["hash"],
+            None if columns is None else tuple(columns),
+        )
+
+    def select(self, date: str = "", **filters) -> list[str]:
+        """Returns the partitions whose parameters match the filters, where a filter
+        value can be a single value or a list of admissible values."""
+        selected = []
+        for name in self.partitions(date):
+            parameters = self.parameters(name)
+            if all(
+                (
+                    parameters.get(column) in value
+                    if isinstance(value, list)
+                    else parameters.get(column) == value
+                )
+                for column, value in filters.items()
+            ):
+                selected.append(name)
+        return selected
+
+    def import_csv(self, filename_csv: str, name: str | None = None) -> str:
+        if name is None:
+            name = os.path.splitext(os.path.basename(filename_csv))[0]
+        mtime_ns, size = _file_signature(filename_csv)
+        source = {"file": filename_csv, "mtime_ns": mtime_ns, "size": size}
+        self.write(name, pd.read_csv(filename_csv), source)
+        return name
+
+    def import_csv_directory(self, directory: str = "data") -> list[str]:
+        """Imports the simulation csv files in directory that are not yet in the
+        store or have changed since their import, and returns the names of the
+        imported partitions."""
+        manifest = self.manifest()
+        imported = []
+        for file in sorted(os.listdir(directory)):
+            # Checkpoints of running (or interrupted) simulations are not imported
+            if (
+                file.split("_")[0] != "simulation"
+                or not file.endswith(".csv")
+                or file.endswith(".partial.csv")
+            ):
+                continue
+            filename_csv = os.path.join(directory, file)
+            name = file[:-4]
+            if name in manifest:
+                source = manifest[name]["source"]
+                if source is None or (
+                    source["mtime_ns"],
+                    source["size"],
+                ) == _file_signature(filename_csv):
+                    continue
+            imported.append(self.import_csv(filename_csv, name))
+        return imported